@@ -1,14 +1,46 @@
 """ Line length checker. """
 import argparse
+import array
+import bisect
+import codecs
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import io
+import itertools
+import json
+import locale
 import os
+import queue
+import re
+import shutil
+import sqlite3
+import stat
+import subprocess
 import sys
+import tarfile
+import tempfile
+import textwrap
+import threading
 import time
+import tokenize
+import zipfile
+import zlib
 
 from identify import identify  # type: ignore
 
+from typing import Any
+from typing import BinaryIO
+from typing import Callable
+from typing import Dict
+from typing import IO
+from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Optional
 from typing import Sequence
+from typing import Set
 from typing import Tuple
 
 if sys.version_info >= (3, 8):
@@ -18,8 +50,65 @@ else:
 
 version = importlib_metadata.version("line-checker")
 
+# filename, fail lines, error message if the file could not be read
+CheckResult = Tuple[str, List[Tuple[int, int]], Optional[str]]
+# text of the fail lines of a file by line number, kept from the check so
+# baseline keys never need the file read again
+LineTexts = Dict[int, str]
+
 DEFAULT_LINE_LENGTH = 80
 SEP = "-"
+SHARD_STRATEGIES = ("hash", "size")
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+SEVERITIES = ("warn", "error")
+# thresholds for fail lines with no saved severity
+ALL_ERRORS = ((0, "error"),)
+# rule codes are the index in RULE_NAMES, line_length must stay first
+RULE_NAMES = ("line_length", "trailing_whitespace", "tabs", "crlf",
+              "final_newline")
+RULE_MESSAGES = {
+    "trailing_whitespace": "trailing whitespace",
+    "tabs": "tab character",
+    "crlf": "CRLF line ending",
+    "final_newline": "no newline at end of file",
+}
+STATS_LIMITS = (72, 79, 80, 88, 100, 120)
+STATS_PERCENTILES = (50, 90, 99)
+PRUNE_DIRS = frozenset((".git", ".hg", ".svn", ".tox", ".nox", "__pycache__",
+                        ".mypy_cache", ".pytest_cache"))
+DISCOVERY_QUEUE_SIZE = 1024
+READ_QUEUE_SIZE = 16
+# everything str.splitlines splits on
+LINE_BREAK = re.compile("\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+LARGE_FILE_MODES = ("stream", "skip")
+PROGRESS_INTERVAL = 0.1
+PROGRESS_LOG_INTERVAL = 10.0
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+LSP_DEBOUNCE = 0.05
+LSP_SEVERITY = {"error": 1, "warn": 2}
+LSP_NEWLINE = re.compile("\r\n|\r|\n")
+# rest list items and fields, their wrapped lines are indented under the
+# item text or one level under the field
+LIST_ITEM = re.compile(r"(?:[-*+]|\d+[.)]|#\.) +(?=\S)")
+FIELD = re.compile(r":[^:\s][^:]*:(?: |$)")
+FIELD_INDENT = "    "
+ARCHIVE_SEP = "::"
+ZIP_EXTENSIONS = (".zip", ".whl")
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+MIN_WRAP_WIDTH = 20
+OPEN_BRACKETS = "([{"
+CLOSE_BRACKETS = ")]}"
+BASELINE_MAGIC = b"LCBASE1\n"
+INDEX_VERSION = 2
+# entries changed this close to the start of a run are not saved in the
+# index, a later change in the same mtime tick would not be seen
+INDEX_RACY_NS = 2 * 10 ** 9
+
+EXIT_OK = 0
+EXIT_VIOLATIONS = 1
+EXIT_USAGE = 2  # argparse exits with 2 on bad arguments
+EXIT_IO_ERROR = 3
 
 
 class LineCheckerError(Exception):
@@ -41,6 +130,487 @@ class ElapseTime:
         return self.end_time - self.start_time
 
 
+class Progress:
+    """ Files and bytes checked per second, drawn by a background thread.
+
+    The check loop only adds to the counters, the thread reads them. On a
+    terminal the line is redrawn in place, otherwise a plain line is
+    written every PROGRESS_LOG_INTERVAL seconds.
+    """
+    def __init__(self,
+                 stream: Optional[IO[str]] = None,
+                 is_tty: Optional[bool] = None) -> None:
+        self.stream = stream or sys.stderr
+        if is_tty is None:
+            is_tty = self.stream.isatty()
+        self.is_tty = is_tty
+        self.interval = PROGRESS_INTERVAL if is_tty else PROGRESS_LOG_INTERVAL
+        self.files_found = 0
+        self.files_done = 0
+        self.bytes_done = 0
+        self.start_time = 0.0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self.start_time = time.time()
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.thread.join()
+        self.render()
+        if self.is_tty:
+            self.stream.write("\n")
+            self.stream.flush()
+
+    def file_done(self, size: int) -> None:
+        self.files_done += 1
+        self.bytes_done += size
+
+    def status(self) -> str:
+        elapse_time = max(time.time() - self.start_time, 1e-9)
+        files_rate = self.files_done / elapse_time
+        mb_rate = self.bytes_done / elapse_time / 1024 / 1024
+        status = (f"{self.files_done}/{self.files_found} files  "
+                  f"{files_rate:.1f} files/s  {mb_rate:.2f} MB/s")
+        remaining = self.files_found - self.files_done
+        if remaining > 0 and files_rate > 0:
+            status += f"  eta {remaining / files_rate:.0f}s"
+        return status
+
+    def render(self) -> None:
+        if self.is_tty:
+            self.stream.write(f"\r\033[K{self.status()}")
+        else:
+            self.stream.write(f"{self.status()}\n")
+        self.stream.flush()
+
+    def _run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            self.render()
+
+
+class Metrics:
+    """ Run metrics written as OpenMetrics text for a textfile collector. """
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+        self.stage_starts: Dict[str, float] = {}
+        self.files = 0
+        self.bytes = 0
+        self.lines = 0
+        self.cache_hits = 0
+        self.workers = 1
+        self.busy_time = 0.0
+        self.violations: Dict[str, int] = {}
+
+    def start_stage(self, stage: str) -> None:
+        self.stage_starts[stage] = time.perf_counter()
+
+    def stop_stage(self, stage: str) -> None:
+        self.stages[stage] = (time.perf_counter()
+                              - self.stage_starts.pop(stage))
+
+    def add_violations(self, fail_list: "FailResults") -> None:
+        for index, filename in enumerate(fail_list.files):
+            file_type = os.path.splitext(filename)[1] or "(none)"
+            count = fail_list.offsets[index + 1] - fail_list.offsets[index]
+            self.violations[file_type] = (self.violations.get(file_type, 0)
+                                          + count)
+
+    def render(self) -> str:
+        check_time = self.stages.get("check", 0.0)
+        utilization = 0.0
+        if check_time > 0:
+            utilization = min(1.0, self.busy_time
+                              / (check_time * self.workers))
+        hit_rate = self.cache_hits / self.files if self.files else 0.0
+        metrics = [
+            ("stage_duration_seconds", "Seconds spent in each stage.",
+             [(f'stage="{stage}"', value)
+              for stage, value in sorted(self.stages.items())]),
+            ("files", "Files checked.", [("", self.files)]),
+            ("bytes", "Bytes checked.", [("", self.bytes)]),
+            ("lines", "Lines checked.", [("", self.lines)]),
+            ("cache_hit_ratio",
+             "Files whose result came from an identical file.",
+             [("", round(hit_rate, 6))]),
+            ("workers", "Worker processes or threads.", [("", self.workers)]),
+            ("worker_utilization_ratio",
+             "Busy time of the workers over the check stage.",
+             [("", round(utilization, 6))]),
+            ("violations", "Fail lines by file type.",
+             [(f'file_type="{file_type}"', count)
+              for file_type, count in sorted(self.violations.items())]),
+        ]
+        out = []
+        for name, help_text, samples in metrics:
+            out.append(f"# TYPE line_checker_{name} gauge")
+            out.append(f"# HELP line_checker_{name} {help_text}")
+            for labels, value in samples:
+                labels = f"{{{labels}}}" if labels else ""
+                if isinstance(value, float):
+                    value = round(value, 6)
+                out.append(f"line_checker_{name}{labels} {value}")
+        out.append("# EOF")
+        return "\n".join(out) + "\n"
+
+    def save(self, filename: str) -> None:
+        # write and rename so a collector never reads a partial file
+        directory = os.path.dirname(os.path.abspath(filename))
+        with tempfile.NamedTemporaryFile("w", dir=directory,
+                                         suffix=".tmp", delete=False) as f:
+            f.write(self.render())
+        os.replace(f.name, filename)
+
+
+class FailResults:
+    """ Failed files and their fail lines stored as columns.
+
+    Line numbers and lengths are kept in flat arrays with an offset per
+    file instead of a list of tuples per file.  Iterating gives
+    (filename, fail_lines) pairs the same as a list of tuples would.
+
+    Fail lines from other rules are (line, column, rule name), the rule
+    is kept as its index in RULE_NAMES.
+    """
+    def __init__(self) -> None:
+        self.files: List[str] = []
+        self.offsets = array.array("L", [0])
+        self.lines = array.array("I")
+        self.lengths = array.array("I")
+        self.rules = array.array("B")
+
+    def add(self, filename: str, fail_lines: Iterable[tuple]) -> None:
+        for fail_line in fail_lines:
+            self.lines.append(fail_line[0])
+            self.lengths.append(fail_line[1])
+            self.rules.append(RULE_NAMES.index(fail_line[2])
+                              if len(fail_line) > 2 else 0)
+        self.files.append(sys.intern(filename))
+        self.offsets.append(len(self.lines))
+
+    def fail_lines(self, index: int) -> Iterator[tuple]:
+        start = self.offsets[index]
+        end = self.offsets[index + 1]
+        if not any(self.rules[start:end]):
+            return zip(self.lines[start:end], self.lengths[start:end])
+        return ((line, length, RULE_NAMES[rule]) if rule else (line, length)
+                for line, length, rule in zip(self.lines[start:end],
+                                              self.lengths[start:end],
+                                              self.rules[start:end]))
+
+    def sorted(self) -> "FailResults":
+        # new results in file name order
+        fails = FailResults()
+        for index in sorted(range(len(self.files)),
+                            key=lambda i: self.files[i]):
+            fails.add(self.files[index], self.fail_lines(index))
+        return fails
+
+    def num_violations(self) -> int:
+        return len(self.lines)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __iter__(self) -> Iterator[Tuple[str, Iterator[Tuple[int, int]]]]:
+        for index, filename in enumerate(self.files):
+            yield filename, self.fail_lines(index)
+
+
+class LengthHistogram:
+    """ Count of lines for each line length. """
+    def __init__(self) -> None:
+        self.counts = array.array("L")
+
+    def add(self, length: int) -> None:
+        if length >= len(self.counts):
+            self.counts.extend([0] * (length + 1 - len(self.counts)))
+        self.counts[length] += 1
+
+    def merge(self, other: "LengthHistogram") -> None:
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for length, count in enumerate(other.counts):
+            self.counts[length] += count
+
+    def total(self) -> int:
+        return sum(self.counts)
+
+    def max_length(self) -> int:
+        for length in range(len(self.counts) - 1, -1, -1):
+            if self.counts[length]:
+                return length
+        return 0
+
+    def lines_over(self, limit: int) -> int:
+        return sum(self.counts[limit + 1:])
+
+    def percentile(self, percent: float) -> int:
+        wanted = self.total() * percent / 100
+        running = 0
+        for length, count in enumerate(self.counts):
+            running += count
+            if count and running >= wanted:
+                return length
+        return 0
+
+
+class LineLengthStats:
+    """ Line length histograms for all files and for each file type. """
+    def __init__(self) -> None:
+        self.histogram = LengthHistogram()
+        self.file_types: Dict[str, LengthHistogram] = {}
+        self.file_max_lengths = array.array("I")
+
+    def add_file(self, filename: str, line_data: Iterable[str]) -> None:
+        histogram = LengthHistogram()
+        for line in line_data:
+            histogram.add(len(line))
+        file_type = os.path.splitext(filename)[1] or "(none)"
+        self.file_types.setdefault(file_type, LengthHistogram())
+        self.file_types[file_type].merge(histogram)
+        self.histogram.merge(histogram)
+        self.file_max_lengths.append(histogram.max_length())
+
+    def files_over(self, limit: int) -> int:
+        return sum(1 for length in self.file_max_lengths if length > limit)
+
+
+class Baseline:
+    """ Sorted 64 bit hashes of known fail lines.
+
+    A fail line is matched on the file name and the text of the line, so
+    it still matches after lines above it are added or removed.
+    """
+    def __init__(self, keys: Iterable[int] = ()) -> None:
+        self.keys = array.array("Q", sorted(set(keys)))
+
+    def __contains__(self, key: int) -> bool:
+        index = bisect.bisect_left(self.keys, key)
+        return index < len(self.keys) and self.keys[index] == key
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def load(cls, filename: str) -> "Baseline":
+        with open(filename, "rb") as f:
+            data = f.read()
+        if not data.startswith(BASELINE_MAGIC):
+            raise LineCheckerError(f"{filename} is not a baseline file")
+        baseline = cls()
+        payload = data[len(BASELINE_MAGIC):]
+        if len(payload) % baseline.keys.itemsize:
+            raise LineCheckerError(f"{filename} is truncated or corrupt")
+        baseline.keys.frombytes(payload)
+        if sys.byteorder == "big":
+            baseline.keys.byteswap()
+        return baseline
+
+    def save(self, filename: str) -> None:
+        keys = array.array("Q", self.keys)
+        if sys.byteorder == "big":
+            keys.byteswap()
+        with open(filename, "wb") as f:
+            f.write(BASELINE_MAGIC)
+            f.write(keys.tobytes())
+
+
+def violation_key(filename: str, line: str) -> int:
+    data = f"{filename}\0{line}".encode("utf-8", "surrogateescape")
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(),
+                          "little")
+
+
+def violation_keys(filename: str,
+                   fail_lines: List[tuple],
+                   texts: Optional[LineTexts] = None) -> List[int]:
+    # texts are kept while checking. only results saved in the index were
+    # not checked this run, their fail lines are read one line at a time.
+    if texts is None:
+        texts = read_lines(filename, {line for line, *_ in fail_lines})
+    return [violation_key(filename, texts[line]) for line, *_ in fail_lines]
+
+
+def read_lines(filename: str, wanted: Set[int]) -> LineTexts:
+    texts = {}
+    with open(filename, "r") as f:
+        for number, line in enumerate(load_stream(f)):
+            if number in wanted:
+                texts[number] = line
+                if len(texts) == len(wanted):
+                    break
+    return texts
+
+
+class ScanIndex:
+    """ Directory listings and file results kept between runs in sqlite.
+
+    A directory with the same mtime as last run is not listed again.  Files
+    are still stat'ed, changing a file does not change the mtime of its
+    directory, and a file with the same size and mtime gets its saved fail
+    lines instead of being read.  Git blobs never change, their fail lines
+    are kept by sha and line length for ``--rev``.
+    """
+    def __init__(self, filename: str, settings: Dict[str, Any]) -> None:
+        self.filename = filename
+        self.settings = json.dumps(settings, sort_keys=True)
+        self.start_ns = int(time.time() * 10 ** 9)
+        self.clear = False
+        self.dirs: Dict[str, Tuple[int, List[str], List[str]]] = {}
+        self.files: Dict[str, Tuple[int, int, str]] = {}
+        self.new_dirs: List[Tuple[str, int, str, str]] = []
+        self.new_files: List[Tuple[str, int, int, str]] = []
+        self.pending: Dict[str, Tuple[int, int]] = {}
+        self.blobs: Dict[Tuple[str, int], str] = {}
+        self.new_blobs: List[Tuple[str, int, str]] = []
+        self.hits = 0
+
+    @classmethod
+    def load(cls, filename: str, settings: Dict[str, Any]) -> "ScanIndex":
+        index = cls(filename, settings)
+        if not os.path.exists(filename):
+            return index
+        connection = sqlite3.connect(filename)
+        try:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if not 0 < version <= INDEX_VERSION:
+                raise LineCheckerError(f"{filename} is not an index file")
+            # blob results only depend on the sha and line length so they
+            # are kept when the settings change
+            if connection.execute("SELECT name FROM sqlite_master WHERE "
+                                  "name = 'blobs'").fetchone():
+                index.blobs = {row[:2]: row[2] for row in connection.execute(
+                    "SELECT sha, line_length, fails FROM blobs")}
+            saved = connection.execute(
+                "SELECT value FROM meta WHERE key = 'settings'").fetchone()
+            # results from other options or an older index can not be used
+            if (saved is None or saved[0] != index.settings
+                    or version != INDEX_VERSION):
+                index.clear = True
+                return index
+            for path, mtime_ns, files, subdirs in connection.execute(
+                    "SELECT path, mtime_ns, files, subdirs FROM dirs"):
+                index.dirs[path] = (mtime_ns, json.loads(files),
+                                    json.loads(subdirs))
+            index.files = {row[0]: row[1:] for row in connection.execute(
+                "SELECT path, size, mtime_ns, fails FROM files")}
+        except sqlite3.DatabaseError as e:
+            raise LineCheckerError(f"{filename} is not an index file: {e}")
+        finally:
+            connection.close()
+        return index
+
+    def add_directory(self,
+                      path: str,
+                      mtime_ns: int,
+                      files: List[str],
+                      subdirs: List[str]) -> None:
+        if mtime_ns < self.start_ns - INDEX_RACY_NS:
+            self.new_dirs.append((path, mtime_ns, json.dumps(files),
+                                  json.dumps(subdirs)))
+
+    def lookup(self,
+               file_list: List[str]) -> Tuple[List[CheckResult], List[str]]:
+        # results for files that have not changed and the files that
+        # need to be checked
+        results: List[CheckResult] = []
+        to_check = []
+        files = self.files
+        for file in file_list:
+            try:
+                info = os.stat(file)
+            except OSError:
+                to_check.append(file)
+                continue
+            key = (info.st_size, info.st_mtime_ns)
+            saved = files.get(file)
+            if saved is not None and saved[:2] == key:
+                fail_lines = ([tuple(fail_line)
+                               for fail_line in json.loads(saved[2])]
+                              if saved[2] else [])
+                results.append((file, fail_lines, None))
+                continue
+            self.pending[file] = key
+            to_check.append(file)
+        self.hits += len(results)
+        return results, to_check
+
+    def record(self, results: Iterable[CheckResult]) -> Iterator[CheckResult]:
+        # save the result of each checked file, files that could not be
+        # read are checked again next time
+        for file, fail_lines, error in results:
+            stat_key = self.pending.pop(file, None)
+            if (error is None and stat_key is not None
+                    and stat_key[1] < self.start_ns - INDEX_RACY_NS):
+                self.new_files.append(
+                    (file, stat_key[0], stat_key[1],
+                     json.dumps(fail_lines) if fail_lines else ""))
+            yield file, fail_lines, error
+
+    def lookup_blob(self,
+                    sha: str,
+                    line_length: int) -> Optional[List[Tuple[int, int]]]:
+        saved = self.blobs.get((sha, line_length))
+        if saved is None:
+            return None
+        self.hits += 1
+        return ([tuple(fail_line) for fail_line in json.loads(saved)]
+                if saved else [])
+
+    def record_blob(self,
+                    sha: str,
+                    line_length: int,
+                    fail_lines: List[Tuple[int, int]]) -> None:
+        self.new_blobs.append((sha, line_length,
+                               json.dumps(fail_lines) if fail_lines else ""))
+
+    def save(self) -> None:
+        if not (self.clear or self.new_dirs or self.new_files
+                or self.new_blobs or not os.path.exists(self.filename)):
+            return
+        connection = sqlite3.connect(self.filename)
+        try:
+            with connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS meta "
+                                   "(key TEXT PRIMARY KEY, value TEXT)")
+                connection.execute("CREATE TABLE IF NOT EXISTS dirs "
+                                   "(path TEXT PRIMARY KEY, mtime_ns INTEGER,"
+                                   " files TEXT, subdirs TEXT)")
+                connection.execute("CREATE TABLE IF NOT EXISTS files "
+                                   "(path TEXT PRIMARY KEY, size INTEGER, "
+                                   "mtime_ns INTEGER, fails TEXT)")
+                connection.execute("CREATE TABLE IF NOT EXISTS blobs "
+                                   "(sha TEXT, line_length INTEGER, "
+                                   "fails TEXT, "
+                                   "PRIMARY KEY (sha, line_length))")
+                if self.clear:
+                    connection.execute("DELETE FROM dirs")
+                    connection.execute("DELETE FROM files")
+                connection.execute("INSERT OR REPLACE INTO meta VALUES "
+                                   "('settings', ?)", (self.settings,))
+                connection.executemany("INSERT OR REPLACE INTO dirs VALUES "
+                                       "(?, ?, ?, ?)", self.new_dirs)
+                connection.executemany("INSERT OR REPLACE INTO files VALUES "
+                                       "(?, ?, ?, ?)", self.new_files)
+                connection.executemany("INSERT OR REPLACE INTO blobs VALUES "
+                                       "(?, ?, ?)", self.new_blobs)
+                connection.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        finally:
+            connection.close()
+
+
+def filter_baseline(filename: str,
+                    fail_lines: List[tuple],
+                    baseline: Baseline,
+                    texts: Optional[LineTexts] = None) -> List[tuple]:
+    keys = violation_keys(filename, fail_lines, texts)
+    return [fail_line for fail_line, key in zip(fail_lines, keys)
+            if key not in baseline]
+
+
 class Display:
     def __init__(self,
                  show_elapse_time: bool,
@@ -91,18 +661,54 @@ class Display:
         print(f"{string}{state}{elapse_time_str}")
 
     def failed_details(self, filename: str,
-                       fail_lines: List[Tuple[int, int]]
+                       fail_lines: Iterable[tuple],
+                       thresholds: Optional[List[Tuple[int, str]]] = None
                        ) -> None:
+        # severity is only shown when there is more than one threshold
         print(f"{filename}")
         for line in fail_lines:
-            print(f"  line: {line[0] + 1}  -  length: {line[1]}")
+            if len(line) > 2:
+                print(f"  line: {line[0] + 1}  -  {RULE_MESSAGES[line[2]]}")
+            elif thresholds and len(thresholds) > 1:
+                level = severity(line[1], thresholds)
+                print(f"  line: {line[0] + 1}  -  length: {line[1]}"
+                      f"  ({level})")
+            else:
+                print(f"  line: {line[0] + 1}  -  length: {line[1]}")
+
+    def severity_summary(self, counts: Dict[str, int]) -> None:
+        if self.quiet_mode and not any(counts.values()):
+            return None
+        print(", ".join(f"{counts[level]} {level}"
+                        for level in SEVERITIES if level in counts))
+
+    def stats(self, stats: LineLengthStats, limits: Sequence[int]) -> None:
+        print(f"{len(stats.file_max_lengths)} files, "
+              f"{stats.histogram.total()} lines")
+        print(f"  {'limit':>6}  {'lines over':>10}  {'files over':>10}")
+        for limit in limits:
+            print(f"  {limit:>6}  {stats.histogram.lines_over(limit):>10}  "
+                  f"{stats.files_over(limit):>10}")
+        percentiles = "".join(f"  {'p' + str(p):>5}"
+                              for p in STATS_PERCENTILES)
+        print(f"  {'type':<8}  {'lines':>10}{percentiles}  {'max':>5}")
+        for file_type in sorted(stats.file_types):
+            histogram = stats.file_types[file_type]
+            percentiles = "".join(f"  {histogram.percentile(p):>5}"
+                                  for p in STATS_PERCENTILES)
+            print(f"  {file_type:<8}  {histogram.total():>10}{percentiles}  "
+                  f"{histogram.max_length():>5}")
+
+    def info(self, msg: str) -> None:
+        if not self.quiet_mode:
+            print(msg)
 
     def error(self, msg: str) -> None:
         print(f"{self.red}{msg}{self.reset_color}")
 
 
 def save_results_to_file(file_list: List[str],
-                         fail_list: list,
+                         fail_list: FailResults,
                          filename: str):
     if filename is None:
         filename = f"line_checker_out{time.strftime('%Y-%m-%d-%H%M%S')}"
@@ -112,15 +718,112 @@ def save_results_to_file(file_list: List[str],
         data += f"{len(file_list)} file checked: failed\n"
         for fail_file, fail_data in fail_list:
             data += f"{fail_file}\n"
-            for line, length in fail_data:
-                data += f"  line {line + 1} - length: {length}\n"
+            for line, length, *rule in fail_data:
+                if rule:
+                    data += f"  line {line + 1} - {RULE_MESSAGES[rule[0]]}\n"
+                else:
+                    data += f"  line {line + 1} - length: {length}\n"
     else:
         data += f"{len(file_list)} file checked: passed\n"
     with open(filename, "w") as f:
         f.write(data)
 
 
+def save_results_to_json(file_list: List[str],
+                         fail_list: FailResults,
+                         filename: str,
+                         errors: Sequence[Tuple[str, str]] = (),
+                         exit_code: int = EXIT_OK,
+                         thresholds: Optional[List[Tuple[int, str]]] = None
+                         ) -> None:
+    # line numbers are saved 1 based, same as the display output. files
+    # that could not be read, the thresholds and the exit code are kept
+    # for merge
+    data = {
+        "files": list(file_list),
+        "fails": [
+            {"file": fail_file,
+             "lines": [[line + 1, *rest] for line, *rest in fail_data]}
+            for fail_file, fail_data in fail_list
+        ],
+        "errors": [{"file": file, "error": error} for file, error in errors],
+        "thresholds": [list(threshold) for threshold in thresholds or []],
+        "exit_code": exit_code,
+    }
+    with open(filename, "w") as f:
+        json.dump(data, f)
+
+
+def load_results_from_json(filename: str
+                           ) -> Tuple[List[str], FailResults, Dict[str, Any]]:
+    # returns the files, the fails and the errors, thresholds and exit
+    # code of the run. results files from before these were saved have
+    # none, every fail line in them is an error
+    try:
+        with open(filename, "r") as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise LineCheckerError(f"{filename} is not a results file: {e}")
+    fails = FailResults()
+    try:
+        file_list = list(data["files"])
+        for fail in data["fails"]:
+            fails.add(fail["file"],
+                      ((line - 1, *rest) for line, *rest in fail["lines"]))
+        run = {
+            "errors": [(error["file"], str(error["error"]))
+                       for error in data.get("errors", [])],
+            "thresholds": [(int(length), level) for length, level
+                           in data.get("thresholds", [])
+                           if level in SEVERITIES] or list(ALL_ERRORS),
+            "exit_code": int(data.get("exit_code", EXIT_OK)),
+        }
+    except (KeyError, TypeError, ValueError, OverflowError, AttributeError):
+        raise LineCheckerError(f"{filename} is not a results file")
+    return file_list, fails, run
+
+
+def merge_results(filenames: Sequence[str]
+                  ) -> Tuple[List[str], FailResults, List[Tuple[str, str]],
+                             List[Tuple[int, str]], int]:
+    # combine shard results files, a file listed in more than one
+    # shard is only counted once. returns the files, fails, read errors,
+    # thresholds and the worst exit code of the shards.
+    file_list: List[str] = []
+    seen = set()
+    failed = {}
+    errors: Dict[str, str] = {}
+    thresholds: Optional[List[Tuple[int, str]]] = None
+    exit_code = EXIT_OK
+    for filename in filenames:
+        shard_files, shard_fails, run = load_results_from_json(filename)
+        if thresholds is None:
+            thresholds = run["thresholds"]
+        elif run["thresholds"] != thresholds:
+            raise LineCheckerError(f"{filename} was checked with other "
+                                   "line lengths")
+        for file in shard_files:
+            if file not in seen:
+                seen.add(file)
+                file_list.append(file)
+        for index, fail_file in enumerate(shard_fails.files):
+            failed.setdefault(fail_file, (shard_fails, index))
+        for file, error in run["errors"]:
+            errors.setdefault(file, error)
+        exit_code = max(exit_code, run["exit_code"])
+    fails = FailResults()
+    for fail_file in sorted(failed):
+        shard_fails, index = failed[fail_file]
+        fails.add(fail_file, shard_fails.fail_lines(index))
+    return (file_list, fails, sorted(errors.items()),
+            thresholds or list(ALL_ERRORS), exit_code)
+
+
 def load_file(filename: str) -> List[str]:
+    archive_member = split_archive_member(filename)
+    if archive_member is not None:
+        with open_archive_member(*archive_member) as f:
+            return [line for line in load_stream(f)]
     try:
         with open(filename, "r") as f:
             data = f.read()
@@ -133,39 +836,1452 @@ def load_file(filename: str) -> List[str]:
     return line_data
 
 
-def discovery(path: str, tags_to_find: List[str],) -> List[str]:
+def load_stream(f: Iterable[str]) -> Iterator[str]:
+    # same lines as load_file without reading the whole file
+    for line in f:
+        yield from line.splitlines()
+
+
+def is_archive(path: str) -> bool:
+    return (path.endswith(ZIP_EXTENSIONS + TAR_EXTENSIONS)
+            and os.path.isfile(path))
+
+
+def split_archive_member(filename: str) -> Optional[Tuple[str, str]]:
+    archive, sep, member = filename.partition(ARCHIVE_SEP)
+    if sep and is_archive(archive):
+        return archive, member
+    return None
+
+
+def open_archive_member(archive: str, member: str) -> IO[str]:
+    if archive.endswith(ZIP_EXTENSIONS):
+        with zipfile.ZipFile(archive) as zf:
+            data = zf.read(member)
+    else:
+        with tarfile.open(archive) as tf:
+            extracted = tf.extractfile(member)
+            if extracted is None:
+                raise FileNotFoundError(f"{member} not in {archive}")
+            data = extracted.read()
+    return io.TextIOWrapper(io.BytesIO(data),
+                            encoding=locale.getpreferredencoding(False))
+
+
+def archive_discovery(path: str, tags_to_find: List[str]) -> List[str]:
+    # members are classified by name only, nothing is extracted
+    if path.endswith(ZIP_EXTENSIONS):
+        with zipfile.ZipFile(path) as zf:
+            names = [info.filename for info in zf.infolist()
+                     if not info.is_dir()]
+    else:
+        with tarfile.open(path) as tf:
+            names = [info.name for info in tf.getmembers() if info.isfile()]
+    return [f"{path}{ARCHIVE_SEP}{name}" for name in names
+            if wanted_member(name, tags_to_find)]
+
+
+def wanted_member(name: str, tags_to_find: List[str]) -> bool:
+    tags = identify.tags_from_filename(name)
+    return any(tf in tags for tf in tags_to_find)
+
+
+def _check_zip_member(archive: str,
+                      member: str,
+                      line_length: int,
+                      local: threading.local,
+                      handles: List[zipfile.ZipFile],
+                      keep_texts: bool = False
+                      ) -> Tuple[List[Tuple[int, int]], Metrics,
+                                 Optional[LineTexts], Optional[str]]:
+    # each thread keeps its own handle so members are read in parallel.
+    # lines and bytes are counted per member and added up by the caller.
+    if not hasattr(local, "zip_file"):
+        local.zip_file = zipfile.ZipFile(archive)
+        handles.append(local.zip_file)
+    counts = Metrics()
+    texts: Optional[LineTexts] = {} if keep_texts else None
+    try:
+        counts.bytes = local.zip_file.getinfo(member).file_size
+        with local.zip_file.open(member) as raw:
+            f = io.TextIOWrapper(raw,
+                                 encoding=locale.getpreferredencoding(False))
+            return (checker(_count_lines(load_stream(f), counts), line_length,
+                            texts),
+                    counts, texts, None)
+    except (OSError, UnicodeDecodeError, zipfile.BadZipFile, KeyError) as e:
+        return [], counts, None, str(e)
+
+
+def check_archive(path: str,
+                  file_list: List[str],
+                  line_length: int,
+                  jobs: int = 1,
+                  metrics: Optional[Metrics] = None,
+                  sizes: Optional[Dict[str, int]] = None,
+                  texts: Optional[Dict[str, LineTexts]] = None
+                  ) -> Iterator[CheckResult]:
+    # sizes gets the size of each member read, members are not on disk
+    members = {file.partition(ARCHIVE_SEP)[2]: file for file in file_list}
+    if path.endswith(ZIP_EXTENSIONS):
+        local = threading.local()
+        handles: List[zipfile.ZipFile] = []
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as ex:
+                results = ex.map(
+                    lambda m: _check_zip_member(path, m, line_length, local,
+                                                handles, texts is not None),
+                    members)
+                for file, (fail_lines, counts, line_texts, error) in zip(
+                        members.values(), results):
+                    _keep_texts(file, line_texts, texts)
+                    if metrics is not None:
+                        metrics.lines += counts.lines
+                    if sizes is not None:
+                        sizes[file] = counts.bytes
+                    yield file, fail_lines, error
+        finally:
+            for handle in handles:
+                handle.close()
+    else:
+        yield from check_tar(path, lambda name: name in members,
+                             line_length, [], metrics, sizes, texts)
+
+
+def check_tar(path: str,
+              wanted: Callable[[str], bool],
+              line_length: int,
+              found: List[str],
+              metrics: Optional[Metrics] = None,
+              sizes: Optional[Dict[str, int]] = None,
+              texts: Optional[Dict[str, LineTexts]] = None
+              ) -> Iterator[CheckResult]:
+    # tar files can only be read in order, so members are picked and
+    # checked in the one pass over the stream. found gets every member
+    # that was picked and sizes the size of each.
+    current = path
+    try:
+        with tarfile.open(path, "r|*") as tf:
+            for info in tf:
+                if not info.isfile() or not wanted(info.name):
+                    continue
+                current = f"{path}{ARCHIVE_SEP}{info.name}"
+                found.append(current)
+                if sizes is not None:
+                    sizes[current] = info.size
+                extracted = tf.extractfile(info)
+                if extracted is None:
+                    continue
+                # stream members can not seek, so no TextIOWrapper here
+                lines = load_stream(codecs.iterdecode(
+                    extracted, locale.getpreferredencoding(False)))
+                if metrics is not None:
+                    lines = _count_lines(lines, metrics)
+                line_texts: Optional[LineTexts] = (
+                    {} if texts is not None else None)
+                try:
+                    fail_lines = checker(lines, line_length, line_texts)
+                except UnicodeDecodeError as e:
+                    yield current, [], str(e)
+                else:
+                    _keep_texts(current, line_texts, texts)
+                    yield current, fail_lines, None
+                current = path
+    except (tarfile.TarError, OSError, EOFError, zlib.error) as e:
+        # a broken stream can not be read any further
+        yield current, [], str(e) or type(e).__name__
+
+
+class GitBlobReader:
+    """ Read blobs from a git repo with one ``git cat-file --batch``.
+
+    Fail lines are cached by blob sha, a blob that shows up at more than
+    one path is only checked once.  With an index, blobs checked in an
+    earlier run are not read again.
+    """
+    def __init__(self,
+                 repo_dir: str,
+                 index: Optional[ScanIndex] = None) -> None:
+        self.process = subprocess.Popen(["git", "cat-file", "--batch"],
+                                        cwd=repo_dir,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE)
+        self.cache: Dict[str, List[Tuple[int, int]]] = {}
+        self.cache_hits = 0
+        self.lines = 0
+        self.index = index
+
+    def read(self, sha: str) -> bytes:
+        assert self.process.stdin and self.process.stdout
+        self.process.stdin.write(f"{sha}\n".encode())
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().split()
+        if len(header) != 3 or header[1] != b"blob":
+            raise OSError(f"git blob {sha} could not be read")
+        data = self.process.stdout.read(int(header[2]))
+        self.process.stdout.read(1)  # newline after the blob
+        return data
+
+    def check(self, sha: str, line_length: int) -> List[Tuple[int, int]]:
+        if sha in self.cache:
+            self.cache_hits += 1
+            return self.cache[sha]
+        saved = (self.index.lookup_blob(sha, line_length)
+                 if self.index is not None else None)
+        if saved is not None:
+            self.cache_hits += 1
+            self.cache[sha] = saved
+            return saved
+        data = self.read(sha).decode(locale.getpreferredencoding(False))
+        line_data = data.splitlines()
+        self.lines += len(line_data)
+        fail_lines = checker(line_data, line_length)
+        self.cache[sha] = fail_lines
+        if self.index is not None:
+            self.index.record_blob(sha, line_length, fail_lines)
+        return fail_lines
+
+    def close(self) -> None:
+        if self.process.stdin:
+            self.process.stdin.close()
+        self.process.wait()
+
+    def __enter__(self) -> "GitBlobReader":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+def git_repo_dir(path: str) -> str:
+    return path if os.path.isdir(path) else os.path.dirname(path) or "."
+
+
+def git_discovery(path: str,
+                  rev: str,
+                  tags_to_find: List[str],
+                  sizes: Optional[Dict[str, int]] = None) -> Dict[str, str]:
+    # files at path in rev, as "rev:path" names mapped to blob sha. sizes
+    # gets the size of each blob from ls-tree without reading it. raises
+    # ValueError when path is missing and LineCheckerError with git's
+    # message when the revision can not be listed.
+    if not os.path.exists(path):
+        raise ValueError(f"{path} does not exist.")
+    repo_dir = git_repo_dir(path)
+    pathspec = "." if os.path.isdir(path) else os.path.basename(path)
+    long_format = ["-l"] if sizes is not None else []
+    try:
+        output = subprocess.run(
+            ["git", "ls-tree", "-r", "-z", *long_format, rev, "--",
+             pathspec],
+            cwd=repo_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            check=True).stdout
+    except OSError as e:
+        raise LineCheckerError(f"git could not be run: {e}")
+    except subprocess.CalledProcessError as e:
+        message = e.stderr.decode("utf-8", "replace").strip()
+        raise LineCheckerError(message or f"git ls-tree {rev} failed")
+    prefix = path if os.path.isdir(path) else os.path.dirname(path)
+    files_to_check = {}
+    for entry in output.decode("utf-8", "surrogateescape").split("\0"):
+        if not entry:
+            continue
+        info, name = entry.split("\t", 1)
+        mode, object_type, sha, *size = info.split()
+        if object_type != "blob" or mode == "120000":
+            continue
+        tags = identify.tags_from_filename(name)
+        for tf in tags_to_find:
+            if tf in tags:
+                file = f"{rev}:{os.path.join(prefix, name)}"
+                files_to_check[file] = sha
+                if sizes is not None:
+                    sizes[file] = int(size[0])
+    return files_to_check
+
+
+def check_git_blobs(file_list: List[str],
+                    shas: Dict[str, str],
+                    reader: GitBlobReader,
+                    line_length: int
+                    ) -> Iterator[CheckResult]:
+    for file in file_list:
+        try:
+            yield file, reader.check(shas[file], line_length), None
+        except (OSError, UnicodeDecodeError) as e:
+            yield file, [], str(e)
+
+
+def file_tags(path: str, follow_symlinks: bool = False) -> Set[str]:
+    # identify tags for path. fifos, sockets and devices get no tags so
+    # they are never opened, a symlink gets the tags of the file it points
+    # to when following symlinks. raises ValueError when path is missing.
+    try:
+        mode = os.lstat(path).st_mode
+    except OSError:
+        raise ValueError(f"{path} does not exist.")
+    if stat.S_ISLNK(mode):
+        if not follow_symlinks:
+            return {"symlink"}
+        try:
+            mode = os.stat(path).st_mode
+        except OSError:
+            return set()
+        if not stat.S_ISREG(mode):
+            return set()
+        return (identify.tags_from_filename(os.path.basename(path))
+                | identify.tags_from_path(os.path.realpath(path)))
+    if stat.S_ISDIR(mode):
+        return {"directory"}
+    if not stat.S_ISREG(mode):
+        return set()
+    return identify.tags_from_path(path)
+
+
+def wanted_entry(entry: "os.DirEntry[str]",
+                 tags_to_find: List[str],
+                 follow_symlinks: bool = False) -> bool:
+    # uses the type scandir already knows, so only regular files and
+    # followed symlinks are looked at by identify
+    try:
+        if entry.is_symlink():
+            tags = file_tags(entry.path, follow_symlinks)
+        elif entry.is_file(follow_symlinks=False):
+            tags = identify.tags_from_path(entry.path)
+        else:
+            return False
+    except (OSError, ValueError):
+        return False
+    return any(tf in tags for tf in tags_to_find)
+
+
+def discovery(path: str,
+              tags_to_find: List[str],
+              follow_symlinks: bool = False) -> List[str]:
     # look at directory or file at path, get tags for each file save
     # save wanted file (path) to a list and return the list
     files_to_check = []
+    if is_archive(path):
+        try:
+            return archive_discovery(path, tags_to_find)
+        except (tarfile.TarError, zipfile.BadZipFile) as e:
+            raise ValueError(e)
     if os.path.isdir(path):
-        for item in os.listdir(path):
-            item_path = os.path.join(path, item)
-            tags = identify.tags_from_path(item_path)
-            for tf in tags_to_find:
-                if tf in tags:
-                    files_to_check.append(item_path)
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if wanted_entry(entry, tags_to_find, follow_symlinks):
+                    files_to_check.append(entry.path)
     else:
-        tags = identify.tags_from_path(path)
+        tags = file_tags(path, follow_symlinks)
         for tf in tags_to_find:
             if tf in tags:
                 files_to_check.append(path)
     return files_to_check
 
 
-def checker(line_data: List[str], line_length: int) -> List[Tuple[int, int]]:
+def parallel_discovery(path: str,
+                       tags_to_find: List[str],
+                       workers: int = 4,
+                       max_queued: int = DISCOVERY_QUEUE_SIZE,
+                       follow_symlinks: bool = False
+                       ) -> Iterator[str]:
+    # walk path and all sub directories with a pool of threads that
+    # share one queue of directories to list. files are yielded as soon
+    # as they are found, at most max_queued wait to be taken.
+    if not os.path.isdir(path):
+        return iter(discovery(path, tags_to_find, follow_symlinks))
+    directories: "queue.Queue[Optional[str]]" = queue.Queue()
+    found: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=max_queued)
+    pending = [1]
+    lock = threading.Lock()
+    # (st_dev, st_ino) of listed directories when following symlinks, a
+    # directory is only listed once so symlink loops end
+    visited: Set[Tuple[int, int]] = set()
+    if follow_symlinks:
+        root = os.stat(path)
+        visited.add((root.st_dev, root.st_ino))
+
+    def new_directory(entry: "os.DirEntry[str]") -> bool:
+        if not follow_symlinks:
+            return not entry.is_symlink()
+        try:
+            info = entry.stat()
+        except OSError:
+            return False
+        with lock:
+            if (info.st_dev, info.st_ino) in visited:
+                return False
+            visited.add((info.st_dev, info.st_ino))
+        return True
+
+    def worker() -> None:
+        while True:
+            directory = directories.get()
+            if directory is None:
+                return
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            is_dir = entry.is_dir(
+                                follow_symlinks=follow_symlinks)
+                        except OSError:
+                            continue
+                        if is_dir:
+                            if (entry.name in PRUNE_DIRS
+                                    or not new_directory(entry)):
+                                continue
+                            with lock:
+                                pending[0] += 1
+                            directories.put(entry.path)
+                        elif wanted_entry(entry, tags_to_find,
+                                          follow_symlinks):
+                            found.put(entry.path)
+            except OSError:
+                pass
+            finally:
+                with lock:
+                    pending[0] -= 1
+                    done = pending[0] == 0
+                if done:
+                    for _ in range(workers):
+                        directories.put(None)
+                    found.put(None)
+
+    def results() -> Iterator[str]:
+        threads = [threading.Thread(target=worker, daemon=True)
+                   for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        directories.put(path)
+        while True:
+            file = found.get()
+            if file is None:
+                break
+            yield file
+        for thread in threads:
+            thread.join()
+
+    return results()
+
+
+def index_discovery(path: str,
+                    tags_to_find: List[str],
+                    index: ScanIndex,
+                    recursive: bool = False,
+                    follow_symlinks: bool = False) -> List[str]:
+    # same files as discovery, or parallel_discovery when recursive, but
+    # directories that have not changed since the index was saved are
+    # not listed again. a listing keeps every file, chmod +x or a new
+    # shebang changes what a file is without touching its directory, so
+    # saved files are classified again on each run.
+    if not os.path.isdir(path):
+        return discovery(path, tags_to_find, follow_symlinks)
+    files_found: List[str] = []
+    visited: Set[Tuple[int, int]] = set()
+    directories = [path]
+    while directories:
+        directory = directories.pop()
+        try:
+            info = os.stat(directory)
+        except OSError:
+            continue
+        if follow_symlinks:
+            if (info.st_dev, info.st_ino) in visited:
+                continue
+            visited.add((info.st_dev, info.st_ino))
+        saved = index.dirs.get(directory)
+        # os.path.join is slow for a name per file
+        prefix = directory.rstrip(os.sep) + os.sep
+        saved = index.dirs.get(directory)
+        if saved is not None and saved[0] == info.st_mtime_ns:
+            _, files, subdirs = saved
+            for name in files:
+                try:
+                    tags = file_tags(prefix + name, follow_symlinks)
+                except ValueError:
+                    continue
+                if any(tf in tags for tf in tags_to_find):
+                    files_found.append(prefix + name)
+        else:
+            files, subdirs, wanted = [], [], []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            is_dir = entry.is_dir(
+                                follow_symlinks=follow_symlinks)
+                            is_file = (entry.is_symlink()
+                                       or entry.is_file(follow_symlinks=False))
+                        except OSError:
+                            continue
+                        if is_dir:
+                            if entry.name not in PRUNE_DIRS:
+                                subdirs.append(entry.name)
+                        elif is_file:
+                            files.append(entry.name)
+                            if wanted_entry(entry, tags_to_find,
+                                            follow_symlinks):
+                                wanted.append(prefix + entry.name)
+            except OSError:
+                continue
+            index.add_directory(directory, info.st_mtime_ns, files, subdirs)
+            files_found.extend(wanted)
+        if recursive:
+            directories.extend(prefix + name for name in reversed(subdirs))
+    return files_found
+
+
+def file_sizes(file_list: List[str]) -> Dict[str, int]:
+    sizes = {}
+    for file in file_list:
+        try:
+            sizes[file] = os.path.getsize(file)
+        except OSError:
+            sizes[file] = 0
+    return sizes
+
+
+class ContentCache:
+    """ Fail lines of file contents already checked in this run.
+
+    Keyed by the size and hash of the bytes read for checking, so a file
+    with the same contents as one already checked is read once and never
+    checked.  Only files whose size matches another file's size are hashed
+    and kept, a file with a unique size can not have a duplicate.
+    """
+    def __init__(self, sizes: Iterable[int]) -> None:
+        counts = collections.Counter(sizes)
+        self.shared = {size for size, count in counts.items() if count > 1}
+        self.results: Dict[Tuple[int, bytes], List[tuple]] = {}
+        self.texts: Dict[Tuple[int, bytes], LineTexts] = {}
+        self.hits = 0
+
+    def key(self, data: bytes) -> Optional[Tuple[int, bytes]]:
+        if len(data) not in self.shared:
+            return None
+        return len(data), hashlib.blake2b(data, digest_size=16).digest()
+
+    def get(self, key: Tuple[int, bytes]) -> Optional[List[tuple]]:
+        fail_lines = self.results.get(key)
+        if fail_lines is not None:
+            self.hits += 1
+        return fail_lines
+
+    def add(self,
+            key: Tuple[int, bytes],
+            fail_lines: List[tuple],
+            texts: Optional[LineTexts] = None) -> None:
+        self.results[key] = fail_lines
+        if texts:
+            self.texts[key] = texts
+
+
+def group_identical(file_list: List[str],
+                    sizes: Dict[str, int]) -> Dict[str, List[str]]:
+    # group hard links of the same inode without reading them. only files
+    # that share a size with another file are stat'ed. returns the first
+    # file of each group mapped to every file in the group.
+    by_size: Dict[int, List[str]] = {}
+    for file in file_list:
+        by_size.setdefault(sizes[file], []).append(file)
+    by_inode: Dict[Tuple[int, int], str] = {}
+    groups: Dict[str, List[str]] = {}
+    for file in file_list:
+        if len(by_size[sizes[file]]) > 1:
+            try:
+                info = os.stat(file)
+            except OSError:
+                groups[file] = [file]
+                continue
+            inode = (info.st_dev, info.st_ino)
+            if inode in by_inode:
+                groups[by_inode[inode]].append(file)
+                continue
+            by_inode[inode] = file
+        groups[file] = [file]
+    return groups
+
+
+def fan_out(results: Iterable[CheckResult],
+            groups: Dict[str, List[str]],
+            texts: Optional[Dict[str, LineTexts]] = None
+            ) -> Iterator[CheckResult]:
+    # give the result of the checked file to every identical file
+    for file, fail_lines, error in results:
+        if texts is not None and file in texts:
+            for same_file in groups[file]:
+                texts[same_file] = texts[file]
+        for same_file in groups[file]:
+            yield same_file, fail_lines, error
+
+
+def check_once(file_list: Iterable[str],
+               check: Callable[[Iterable[str]], Iterator[CheckResult]],
+               follow_symlinks: bool = False,
+               sizes: Optional[Dict[str, int]] = None,
+               texts: Optional[Dict[str, LineTexts]] = None
+               ) -> Iterator[CheckResult]:
+    # check a stream of files reading each inode once. a hard link, or a
+    # followed symlink, of a file already seen gets the result of that
+    # file once it is known instead of being read again. sizes gets the
+    # size of every file from the same stat.
+    first: Dict[Tuple[int, int], str] = {}
+    sources: Set[str] = set()
+    checked: Dict[str, Tuple[List[tuple], Optional[str]]] = {}
+    checked_texts: Dict[str, LineTexts] = {}
+    waiting: List[Tuple[str, str]] = []
+
+    def unique() -> Iterator[str]:
+        for file in file_list:
+            try:
+                info = os.stat(file)
+            except OSError:
+                yield file
+                continue
+            if sizes is not None:
+                sizes[file] = info.st_size
+            # a file with one link can only be found again by a symlink
+            if info.st_nlink > 1 or follow_symlinks:
+                inode = (info.st_dev, info.st_ino)
+                if inode in first:
+                    waiting.append((file, first[inode]))
+                    continue
+                first[inode] = file
+                sources.add(file)
+            yield file
+
+    def linked() -> Iterator[CheckResult]:
+        ready = [item for item in waiting if item[1] in checked]
+        for item in ready:
+            waiting.remove(item)
+            if texts is not None and item[1] in checked_texts:
+                texts[item[0]] = checked_texts[item[1]]
+            yield (item[0], *checked[item[1]])
+
+    for file, fail_lines, error in check(unique()):
+        if file in sources:
+            checked[file] = (fail_lines, error)
+            if texts is not None and file in texts:
+                checked_texts[file] = texts[file]
+        yield file, fail_lines, error
+        yield from linked()
+    yield from linked()
+
+
+def shard_files(file_list: List[str],
+                shard_index: int,
+                shard_count: int,
+                strategy: str = "hash") -> List[str]:
+    # shard_index is 1 based. every node has to see the same file list
+    # for the shards to add up to the whole list without overlap.
+    if strategy == "hash":
+        return [file for file in file_list
+                if zlib.crc32(file.encode()) % shard_count == shard_index - 1]
+    elif strategy == "size":
+        # largest files first into the bin with the fewest bytes so far
+        sizes = file_sizes(file_list)
+        bins = [0] * shard_count
+        wanted = set()
+        for file in sorted(file_list, key=lambda f: (-sizes[f], f)):
+            smallest = bins.index(min(bins))
+            bins[smallest] += sizes[file]
+            if smallest == shard_index - 1:
+                wanted.add(file)
+        return [file for file in file_list if file in wanted]
+    else:
+        raise LineCheckerError(f"unknown shard strategy: {strategy}")
+
+
+def positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: '{value}'")
+    return number
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    try:
+        index, count = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid shard '{value}', expected i/N")
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            f"invalid shard '{value}', i must be between 1 and N")
+    return index, count
+
+
+def severity(length: int, thresholds: List[Tuple[int, str]]) -> str:
+    # the worst severity of the thresholds the length is over
+    worst = ""
+    for limit, level in thresholds:
+        if length > limit and (not worst or SEVERITIES.index(level)
+                               > SEVERITIES.index(worst)):
+            worst = level
+    return worst
+
+
+def severity_counts(fail_list: FailResults,
+                    thresholds: List[Tuple[int, str]]) -> Dict[str, int]:
+    # fail lines from rules other than line length are errors
+    counts = {level: 0 for _, level in thresholds}
+    for length, rule in zip(fail_list.lengths, fail_list.rules):
+        level = severity(length, thresholds) if rule == 0 else "error"
+        counts[level] = counts.get(level, 0) + 1
+    return counts
+
+
+def failed_files(fail_list: FailResults,
+                 thresholds: List[Tuple[int, str]]) -> int:
+    # files with at least one error line, files with only warnings pass
+    count = 0
+    for index in range(len(fail_list)):
+        start = fail_list.offsets[index]
+        end = fail_list.offsets[index + 1]
+        if any(rule or severity(length, thresholds) == "error"
+               for length, rule in zip(fail_list.lengths[start:end],
+                                       fail_list.rules[start:end])):
+            count += 1
+    return count
+
+
+def parse_threshold(value: str) -> Tuple[int, str]:
+    length, _, level = value.partition(":")
+    level = level or "error"
+    if level not in SEVERITIES:
+        raise argparse.ArgumentTypeError(
+            f"invalid severity '{level}', expected one of "
+            f"{', '.join(SEVERITIES)}")
+    try:
+        return int(length), level
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid line length: '{length}'")
+
+
+class Rule:
+    """ A check other than line length.
+
+    prefilter is a cheap test on the whole text, lines are only looked at
+    when it passes.  check gets a line without its line break and the line
+    break, and returns the column of the fail or None.
+    """
+    def __init__(self,
+                 name: str,
+                 check: Callable[[str, str], Optional[int]],
+                 prefilter: Callable[[str], bool]) -> None:
+        self.name = name
+        self.check = check
+        self.prefilter = prefilter
+
+
+def _trailing_whitespace(body: str, end: str) -> Optional[int]:
+    if body.endswith((" ", "\t")):
+        return len(body.rstrip(" \t"))
+    return None
+
+
+def _tab(body: str, end: str) -> Optional[int]:
+    column = body.find("\t")
+    return column if column >= 0 else None
+
+
+# a space or tab before anything str.splitlines takes as a line break
+TRAILING_WHITESPACE = re.compile(
+    "[ \t](?:[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]|\\Z)")
+
+RULES = {
+    "trailing_whitespace": Rule(
+        "trailing_whitespace", _trailing_whitespace,
+        lambda text: TRAILING_WHITESPACE.search(text) is not None),
+    "tabs": Rule("tabs", _tab, lambda text: "\t" in text),
+    "crlf": Rule("crlf",
+                 lambda body, end: len(body) if end == "\r\n" else None,
+                 lambda text: "\r\n" in text),
+    # only the last line can have no line break
+    "final_newline": Rule(
+        "final_newline",
+        lambda body, end: len(body) if end == "" else None,
+        lambda text: bool(text) and not text.endswith("\n")),
+}
+
+
+def run_rules(text: str,
+              line_length: int,
+              rules: Sequence[str],
+              line_data: Optional[List[str]] = None,
+              texts: Optional[LineTexts] = None) -> List[tuple]:
+    # all rules over one read of the file. line length fails are
+    # (line, length), other rules (line, column, rule name). lines are
+    # split the same way as load_file so line numbers match the baseline.
+    if line_data is None:
+        line_data = text.splitlines()
+    check_length = "line_length" in rules
+    active = [RULES[name] for name in RULE_NAMES
+              if name in rules and name in RULES
+              and RULES[name].prefilter(text)]
+    if not active:
+        return (checker(line_data, line_length, texts) if check_length
+                else [])
+    fail_lines: List[tuple] = []
+    for number, (body, line) in enumerate(zip(line_data,
+                                              text.splitlines(True))):
+        if check_length and len(body) > line_length:
+            fail_lines.append((number, len(body)))
+        end = line[len(body):]
+        for rule in active:
+            column = rule.check(body, end)
+            if column is not None:
+                fail_lines.append((number, column, rule.name))
+        if texts is not None and fail_lines and fail_lines[-1][0] == number:
+            texts[number] = body
+    return fail_lines
+
+
+def check_rules(file_list: Iterable[str],
+                line_length: int,
+                rules: Sequence[str],
+                metrics: Optional[Metrics] = None,
+                cache: Optional[ContentCache] = None,
+                texts: Optional[Dict[str, LineTexts]] = None
+                ) -> Iterator[CheckResult]:
+    for file in file_list:
+        try:
+            # decoding the bytes keeps line endings for the crlf rule
+            with open(file, "rb") as f:
+                data = f.read()
+            key = cache.key(data) if cache is not None else None
+            fail_lines = cache.get(key) if key is not None else None
+            if fail_lines is not None:
+                _cached_texts(cache, key, file, texts)
+                yield file, fail_lines, None
+                continue
+            text = data.decode(locale.getpreferredencoding(False))
+            del data
+        except (OSError, UnicodeDecodeError) as e:
+            yield file, [], str(e)
+            continue
+        line_data = text.splitlines()
+        if metrics is not None:
+            metrics.lines += len(line_data)
+        line_texts: Optional[LineTexts] = {} if texts is not None else None
+        fail_lines = run_rules(text, line_length, rules, line_data, line_texts)
+        _keep_texts(file, line_texts, texts)
+        if key is not None:
+            cache.add(key, fail_lines, line_texts)
+        yield file, fail_lines, None
+
+
+def parse_rules(value: str) -> Tuple[str, ...]:
+    rules = tuple(rule.strip() for rule in value.split(",") if rule.strip())
+    for rule in rules:
+        if rule not in RULE_NAMES:
+            raise argparse.ArgumentTypeError(
+                f"unknown rule '{rule}', expected some of "
+                f"{', '.join(RULE_NAMES)}")
+    return rules
+
+
+def checker(line_data: Iterable[str],
+            line_length: int,
+            texts: Optional[LineTexts] = None) -> List[Tuple[int, int]]:
     fail_lines = []
     for i, line in enumerate(line_data):
         line_len = len(line)
         if line_len > line_length:
             fail_lines.append((i, line_len))
+            if texts is not None:
+                texts[i] = line
     return fail_lines
 
 
+def check_chunk(filename: str,
+                start: int,
+                end: int,
+                line_length: int,
+                texts: Optional[LineTexts] = None
+                ) -> Tuple[int, List[Tuple[int, int]]]:
+    # check the lines that start in the byte range start to end. returns
+    # the number of lines in the chunk and the fails with line numbers
+    # relative to the start of the chunk.
+    with open(filename, "rb") as f:
+        if start > 0:
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                f.readline()
+        position = f.tell()
+        if position >= end:
+            return 0, []
+        data = f.read(end - position)
+        if data and not data.endswith(b"\n"):
+            data += f.readline()
+    line_data = data.decode(locale.getpreferredencoding(False)).splitlines()
+    return len(line_data), checker(line_data, line_length, texts)
+
+
+def schedule(file_list: List[str],
+             sizes: Dict[str, int],
+             chunk_size: int) -> List[Tuple[str, int, int]]:
+    # split files into byte range chunks, biggest work first so large
+    # files do not hold up the end of the run
+    work = []
+    for file in file_list:
+        size = sizes[file]
+        for start in range(0, max(size, 1), chunk_size):
+            work.append((file, start, min(start + chunk_size, size)))
+    work.sort(key=lambda item: item[2] - item[1], reverse=True)
+    return work
+
+
+class ResourceLimits:
+    """ Limits for reading files and the files they caught. """
+    def __init__(self,
+                 max_memory: Optional[int] = None,
+                 max_file_size: Optional[int] = None,
+                 large_files: str = "stream",
+                 queue_size: int = READ_QUEUE_SIZE) -> None:
+        self.max_memory = max_memory
+        self.max_file_size = max_file_size
+        self.large_files = large_files
+        self.queue_size = queue_size
+        self.skipped: List[str] = []
+        self.streamed: List[str] = []
+
+    def active(self) -> bool:
+        return self.max_memory is not None or self.max_file_size is not None
+
+    def file_limit(self) -> Optional[int]:
+        # files bigger than this are never read into memory whole
+        limits = [limit for limit in (self.max_memory, self.max_file_size)
+                  if limit is not None]
+        return min(limits) if limits else None
+
+    def skip_large_files(self,
+                         file_list: List[str],
+                         sizes: Dict[str, int]) -> List[str]:
+        limit = self.file_limit()
+        if limit is None or self.large_files != "skip":
+            return file_list
+        wanted = []
+        for file in file_list:
+            if sizes[file] > limit:
+                self.skipped.append(file)
+            else:
+                wanted.append(file)
+        return wanted
+
+
+def check_files_limited(file_list: Iterable[str],
+                        line_length: int,
+                        limits: ResourceLimits,
+                        metrics: Optional[Metrics] = None,
+                        cache: Optional[ContentCache] = None,
+                        texts: Optional[Dict[str, LineTexts]] = None
+                        ) -> Iterator[CheckResult]:
+    # a reader thread loads files into a bounded queue for the checker.
+    # the bytes of files waiting in the queue stay under max_memory and
+    # files over the file limit are streamed or skipped.
+    read_queue: "queue.Queue[Optional[tuple]]" = queue.Queue(
+        maxsize=limits.queue_size)
+    budget = threading.Condition()
+    in_flight = [0]
+    file_limit = limits.file_limit()
+
+    def reader() -> None:
+        for file in file_list:
+            try:
+                size = os.path.getsize(file)
+                if file_limit is not None and size > file_limit:
+                    read_queue.put((file, None, size, None, None))
+                    continue
+                # reading holds the bytes and the decoded text at once
+                size *= 2
+                with budget:
+                    while (limits.max_memory is not None and in_flight[0]
+                           and in_flight[0] + size > limits.max_memory):
+                        budget.wait()
+                    in_flight[0] += size
+                try:
+                    with open(file, "rb") as f:
+                        raw = f.read()
+                    key = cache.key(raw) if cache is not None else None
+                    data = raw.decode(locale.getpreferredencoding(False))
+                    del raw
+                except BaseException:
+                    with budget:
+                        in_flight[0] -= size
+                        budget.notify()
+                    raise
+                # then only the text, which can take up to 4 bytes a
+                # character
+                with budget:
+                    in_flight[0] += sys.getsizeof(data) - size
+                    size = sys.getsizeof(data)
+                read_queue.put((file, data, size, key, None))
+                del data
+            except (OSError, UnicodeDecodeError) as e:
+                read_queue.put((file, None, 0, None, str(e)))
+        read_queue.put(None)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    while True:
+        item = read_queue.get()
+        if item is None:
+            break
+        file, data, size, key, error = item
+        if error is not None:
+            yield file, [], error
+        elif data is not None:
+            fail_lines = cache.get(key) if key is not None else None
+            if fail_lines is not None:
+                _cached_texts(cache, key, file, texts)
+            else:
+                # one line at a time, a list of every line would take many
+                # times the size of the text
+                line_data = iter_lines(data)
+                if metrics is not None:
+                    line_data = _count_lines(line_data, metrics)
+                line_texts: Optional[LineTexts] = (
+                    {} if texts is not None else None)
+                fail_lines = checker(line_data, line_length, line_texts)
+                del line_data
+                _keep_texts(file, line_texts, texts)
+                if key is not None:
+                    cache.add(key, fail_lines, line_texts)
+            del data
+            with budget:
+                in_flight[0] -= size
+                budget.notify()
+            yield file, fail_lines, None
+        elif limits.large_files == "skip":
+            limits.skipped.append(file)
+        else:
+            limits.streamed.append(file)
+            try:
+                with open(file, "r") as f:
+                    line_data = load_stream(f)
+                    if metrics is not None:
+                        line_data = _count_lines(line_data, metrics)
+                    line_texts = {} if texts is not None else None
+                    fail_lines = checker(line_data, line_length, line_texts)
+                _keep_texts(file, line_texts, texts)
+                yield file, fail_lines, None
+            except (OSError, UnicodeDecodeError) as e:
+                yield file, [], str(e)
+    thread.join()
+
+
+def iter_lines(text: str) -> Iterator[str]:
+    # the same lines as text.splitlines(), one at a time
+    start = 0
+    for match in LINE_BREAK.finditer(text):
+        yield text[start:match.start()]
+        start = match.end()
+    if start < len(text):
+        yield text[start:]
+
+
+def _count_lines(line_data: Iterable[str],
+                 metrics: Metrics) -> Iterator[str]:
+    for line in line_data:
+        metrics.lines += 1
+        yield line
+
+
+def parse_size(value: str) -> int:
+    # bytes with an optional K, M or G suffix
+    number, unit = value[:-1], value[-1:].upper()
+    if unit not in SIZE_UNITS:
+        number, unit = value, ""
+    try:
+        size = int(float(number) * SIZE_UNITS[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: '{value}'")
+    if size < 1:
+        raise argparse.ArgumentTypeError(f"size must be positive: '{value}'")
+    return size
+
+
+def _record(items: Iterable[str], record: List[str]) -> Iterator[str]:
+    for item in items:
+        record.append(item)
+        yield item
+
+
+def check_files(file_list: Iterable[str],
+                line_length: int,
+                metrics: Optional[Metrics] = None,
+                cache: Optional[ContentCache] = None,
+                texts: Optional[Dict[str, LineTexts]] = None
+                ) -> Iterator[CheckResult]:
+    # yields filename, fail lines and an error message if the file
+    # could not be read. with a cache files with the same contents as a
+    # file already checked get its fail lines. texts gets the text of the
+    # fail lines of each file.
+    for file in file_list:
+        try:
+            if cache is None:
+                line_data = load_file(file)
+            else:
+                with open(file, "rb") as f:
+                    data = f.read()
+                key = cache.key(data)
+                fail_lines = cache.get(key) if key is not None else None
+                if fail_lines is not None:
+                    _cached_texts(cache, key, file, texts)
+                    yield file, fail_lines, None
+                    continue
+                line_data = data.decode(
+                    locale.getpreferredencoding(False)).splitlines()
+                del data
+        except (OSError, UnicodeDecodeError) as e:
+            yield file, [], str(e)
+            continue
+        if metrics is not None:
+            metrics.lines += len(line_data)
+        line_texts: Optional[LineTexts] = {} if texts is not None else None
+        fail_lines = checker(line_data, line_length, line_texts)
+        _keep_texts(file, line_texts, texts)
+        if cache is not None and key is not None:
+            cache.add(key, fail_lines, line_texts)
+        yield file, fail_lines, None
+
+
+def _keep_texts(file: str,
+                line_texts: Optional[LineTexts],
+                texts: Optional[Dict[str, LineTexts]]) -> None:
+    if line_texts and texts is not None:
+        texts[file] = line_texts
+
+
+def _cached_texts(cache: ContentCache,
+                  key: Tuple[int, bytes],
+                  file: str,
+                  texts: Optional[Dict[str, LineTexts]]) -> None:
+    # a file with the same contents has the same fail line texts
+    _keep_texts(file, cache.texts.get(key), texts)
+
+
+def _timed_check_chunk(filename: str,
+                       start: int,
+                       end: int,
+                       line_length: int,
+                       keep_texts: bool = False
+                       ) -> Tuple[float, int, List[Tuple[int, int]],
+                                  Optional[LineTexts]]:
+    start_time = time.perf_counter()
+    texts: Optional[LineTexts] = {} if keep_texts else None
+    num_lines, fail_lines = check_chunk(filename, start, end, line_length,
+                                        texts)
+    return time.perf_counter() - start_time, num_lines, fail_lines, texts
+
+
+def parallel_checker(file_list: List[str],
+                     line_length: int,
+                     jobs: int,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     sizes: Optional[Dict[str, int]] = None,
+                     metrics: Optional[Metrics] = None,
+                     texts: Optional[Dict[str, LineTexts]] = None
+                     ) -> Iterator[CheckResult]:
+    if sizes is None:
+        sizes = file_sizes(file_list)
+    work = schedule(file_list, sizes, chunk_size)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as ex:
+        futures = {(file, start): ex.submit(_timed_check_chunk, file, start,
+                                            end, line_length,
+                                            texts is not None)
+                   for file, start, end in work}
+
+        for file in file_list:
+            # stitch chunks back together in file order, each file is
+            # yielded as soon as its own chunks are done
+            fail_lines: List[Tuple[int, int]] = []
+            line_texts: LineTexts = {}
+            error = None
+            line_offset = 0
+            for start in range(0, max(sizes[file], 1), chunk_size):
+                try:
+                    busy, num_lines, chunk_fails, chunk_texts = (
+                        futures.pop((file, start)).result())
+                except (OSError, UnicodeDecodeError) as e:
+                    fail_lines = []
+                    error = str(e)
+                    break
+                if metrics is not None:
+                    metrics.busy_time += busy
+                    metrics.lines += num_lines
+                fail_lines.extend((line + line_offset, length)
+                                  for line, length in chunk_fails)
+                if chunk_texts:
+                    line_texts.update((line + line_offset, text)
+                                      for line, text in chunk_texts.items())
+                line_offset += num_lines
+            if error is None:
+                _keep_texts(file, line_texts, texts)
+            yield file, fail_lines, error
+
+
+def summary_json(num_checked: int,
+                 num_failed: int,
+                 num_violations: int,
+                 num_errors: int,
+                 num_bytes: int,
+                 elapse_time: float,
+                 exit_code: int,
+                 severities: Optional[Dict[str, int]] = None) -> None:
+    # single line for ci scripts, kept off stdout so it never mixes
+    # with the report
+    data: Dict[str, Any] = {
+        "files_checked": num_checked,
+        "files_failed": num_failed,
+        "violations": num_violations,
+        "violations_by_severity": severities or {},
+        "io_errors": num_errors,
+        "bytes": num_bytes,
+        "elapse_time": round(elapse_time, 6),
+        "exit_code": exit_code,
+    }
+    print(json.dumps(data, separators=(",", ":")), file=sys.stderr)
+
+
+def _docstring_text_lines(docstring: str) -> List[int]:
+    # lines of a docstring, counted from its first line, that are plain
+    # text. doctest examples and their output, lines indented deeper than
+    # the body such as literal blocks, and lines that are only a url or a
+    # link target would break if wrapped.
+    lines = docstring.split("\n")[1:-1]
+    indents = [len(line) - len(line.lstrip()) for line in lines
+               if line.strip()]
+    body_indent = min(indents) if indents else 0
+    text_lines = []
+    in_example = False
+    for number, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if not stripped:
+            in_example = False
+            continue
+        if stripped.startswith((">>>", "...")):
+            in_example = True
+        if (in_example
+                or len(line) - len(line.lstrip()) > body_indent
+                or stripped.startswith(".. _")
+                or ("://" in stripped and " " not in stripped)):
+            continue
+        text_lines.append(number)
+    return text_lines
+
+
+def plan_fixes(filename: str, flagged: Set[int]) -> Dict[int, tuple]:
+    # tokenize the file once and note how each flagged line can be fixed:
+    #   ("comment", col) - comment on its own line
+    #   ("docstring",)   - text line inside a docstring
+    #   ("string", [(start_col, end_col), ...]) - string literals inside
+    #                      brackets that can be split into two literals
+    plan: Dict[int, tuple] = {}
+    depth = 0
+    previous_type = tokenize.ENCODING
+    skip_types = (tokenize.NL, tokenize.COMMENT)
+    try:
+        with tokenize.open(filename) as f:
+            for token in tokenize.generate_tokens(f.readline):
+                row = token.start[0] - 1
+                if token.type == tokenize.OP:
+                    if token.string in OPEN_BRACKETS:
+                        depth += 1
+                    elif token.string in CLOSE_BRACKETS:
+                        depth -= 1
+                elif token.type == tokenize.COMMENT:
+                    code = token.line[:token.start[1]]
+                    if row in flagged and not code.strip():
+                        plan[row] = ("comment", token.start[1])
+                elif token.type == tokenize.STRING:
+                    body = token.string.lstrip("rRbBuUfF")
+                    prefix = token.string[:len(token.string) - len(body)]
+                    quote = body[:3]
+                    if (token.start[0] != token.end[0]
+                            and quote in ('"""', "'''")
+                            and previous_type in (tokenize.ENCODING,
+                                                  tokenize.NEWLINE,
+                                                  tokenize.INDENT,
+                                                  tokenize.DEDENT)):
+                        for inner in _docstring_text_lines(token.string):
+                            if row + inner in flagged:
+                                plan[row + inner] = ("docstring",)
+                    elif (row in flagged
+                          and token.start[0] == token.end[0]
+                          and depth > 0
+                          and quote[:1] in ("'", '"')
+                          and quote not in ('"""', "'''")
+                          and "f" not in prefix.lower()):
+                        plan.setdefault(row, ("string", []))
+                        if plan[row][0] == "string":
+                            plan[row][1].append((token.start[1],
+                                                 token.end[1]))
+                if token.type not in skip_types:
+                    previous_type = token.type
+    except (tokenize.TokenError, SyntaxError):
+        return {}
+    return plan
+
+
+def _wrap(indent: str, prefix: str, text: str,
+          line_length: int, hang: str = "") -> Optional[List[str]]:
+    # hang is extra indent for every line after the first
+    width = line_length - len(indent) - len(prefix)
+    if width - len(hang) < MIN_WRAP_WIDTH:
+        return None
+    parts = textwrap.wrap(text, width=width, subsequent_indent=hang,
+                          break_long_words=False, break_on_hyphens=False)
+    if len(parts) < 2:
+        return None
+    return [f"{indent}{prefix}{part}" for part in parts]
+
+
+def _split_string(line: str, start: int, end: int,
+                  line_length: int) -> Optional[Tuple[str, str, int]]:
+    # split the string literal at line[start:end] after a space so the
+    # first part fits. returns the first line, the continuation line and
+    # the end of the literal in the continuation line
+    token = line[start:end]
+    prefix = token[:len(token) - len(token.lstrip("rRbBuU"))]
+    quote = token[len(prefix)]
+    body_start = start + len(prefix) + 1
+    split_at = None
+    for i in range(body_start + 1, min(end - 1, line_length)):
+        if line[i - 1] == " ":
+            split_at = i
+    if split_at is None:
+        return None
+    first = line[:split_at] + quote
+    rest = " " * start + prefix + quote + line[split_at:]
+    return first, rest, start + len(prefix) + 1 + end - split_at
+
+
+def fix_line(line: str, plan: tuple, line_length: int) -> List[str]:
+    kind = plan[0]
+    if kind == "comment":
+        col = plan[1]
+        text = line[col:].lstrip("#").strip()
+        if line[col:].startswith("#!") or "noqa" in text or "type:" in text:
+            return [line]
+        return _wrap(line[:col], "# ", text, line_length) or [line]
+    elif kind == "docstring":
+        if line.endswith("\\"):
+            return [line]
+        stripped = line.lstrip()
+        indent = line[:len(line) - len(stripped)]
+        hang = ""
+        item = LIST_ITEM.match(stripped)
+        if item is not None:
+            hang = " " * item.end()
+        elif FIELD.match(stripped):
+            hang = FIELD_INDENT
+        return _wrap(indent, "", stripped, line_length, hang) or [line]
+    else:
+        for start, end in plan[1]:
+            if end <= line_length:
+                continue
+            new_lines = []
+            while len(line) > line_length:
+                split = _split_string(line, start, end, line_length)
+                if split is None:
+                    break
+                first, line, end = split
+                new_lines.append(first)
+            return new_lines + [line]
+        return [line]
+
+
+def fix_file(filename: str,
+             fail_lines: List[tuple],
+             line_length: int) -> int:
+    # rewrite the fail lines that can be fixed safely. the file is
+    # streamed into a temp file next to it which then replaces the
+    # original. returns the number of lines fixed.
+    flagged = {fail_line[0] for fail_line in fail_lines
+               if len(fail_line) == 2}
+    plan = plan_fixes(filename, flagged)
+    if not plan:
+        return 0
+    with open(filename, "rb") as f:
+        encoding, _ = tokenize.detect_encoding(f.readline)
+
+    directory, basename = os.path.split(os.path.abspath(filename))
+    fixed = 0
+    with open(filename, "r", encoding=encoding, newline="") as source, \
+            tempfile.NamedTemporaryFile("w", encoding=encoding, newline="",
+                                        dir=directory,
+                                        prefix=f".{basename}.",
+                                        suffix=".tmp",
+                                        delete=False) as out:
+        try:
+            for index, raw_line in enumerate(source):
+                line = raw_line.rstrip("\r\n")
+                ending = raw_line[len(line):]
+                if len(line.splitlines()) > 1:
+                    # line numbers from splitlines would not match
+                    fixed = 0
+                    break
+                if index in plan:
+                    new_lines = fix_line(line, plan[index], line_length)
+                    if new_lines != [line]:
+                        fixed += 1
+                        out.write((ending or "\n").join(new_lines) + ending)
+                        continue
+                out.write(raw_line)
+        except BaseException:
+            out.close()
+            os.remove(out.name)
+            raise
+    if fixed:
+        shutil.copymode(filename, out.name)
+        os.replace(out.name, filename)
+    else:
+        os.remove(out.name)
+    return fixed
+
+
+def fix_files(fail_list: FailResults,
+              line_length: int,
+              jobs: int = 1) -> Dict[str, int]:
+    work = [(file, list(fail_lines)) for file, fail_lines in fail_list]
+    if jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as ex:
+            futures = [ex.submit(fix_file, file, fail_lines, line_length)
+                       for file, fail_lines in work]
+            return {file: future.result()
+                    for (file, _), future in zip(work, futures)}
+    return {file: fix_file(file, fail_lines, line_length)
+            for file, fail_lines in work}
+
+
+def line_length_stats(file_list: List[str],
+                      load: Callable[[str], Iterable[str]] = load_file
+                      ) -> Tuple[LineLengthStats, int]:
+    # one pass over every file, returns the stats and number of files
+    # that could not be read
+    stats = LineLengthStats()
+    error_count = 0
+    for file in file_list:
+        try:
+            stats.add_file(file, load(file))
+        except (OSError, UnicodeDecodeError):
+            error_count += 1
+    return stats, error_count
+
+
 def argument_parsing(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser()
     parser.add_argument("file", type=str, help="Filename to check.")
-    parser.add_argument("-l", dest="line_length", action="store", type=int,
-                        default=DEFAULT_LINE_LENGTH, help="max line length")
+    parser.add_argument("-l", dest="thresholds", action="append",
+                        type=parse_threshold, metavar="length[:severity]",
+                        help="max line length, severity is warn or error "
+                             "(default error). can be given more than once")
     parser.add_argument("-E", "--elapse_time", action="store_true",
                         help="elapse time in seconds to run check")
     parser.add_argument("-q", dest="quiet_mode", action="store_true",
@@ -174,49 +2290,701 @@ def argument_parsing(argv: Optional[Sequence[str]] = None) -> argparse.Namespace
                         help="Save output to file")
     parser.add_argument("--out_file", action="store", metavar="filename",
                         help="file name to save results to")
+    parser.add_argument("--json_out", action="store", metavar="filename",
+                        help="save results as json, used by merge")
+    parser.add_argument("--discovery_threads", action="store",
+                        type=positive_int, metavar="N",
+                        help="find files in sub directories too, listing "
+                             "directories with N threads")
+    parser.add_argument("--follow_symlinks", "--follow-symlinks",
+                        action="store_true",
+                        help="check files and directories that symlinks "
+                             "point to, each directory is listed once")
+    parser.add_argument("--index", action="store", metavar="filename",
+                        help="keep directory listings and results in an "
+                             "index file so unchanged files are not read "
+                             "again")
+    parser.add_argument("--max_memory", "--max-memory", action="store",
+                        type=parse_size, metavar="size",
+                        help="limit bytes of file data held in memory, "
+                             "for example 512M")
+    parser.add_argument("--max_file_size", "--max-file-size", action="store",
+                        type=parse_size, metavar="size",
+                        help="files bigger than this are streamed or skipped")
+    parser.add_argument("--large_files", action="store",
+                        choices=LARGE_FILE_MODES, default="stream",
+                        help="what to do with files over the size limit")
+    parser.add_argument("--queue_size", action="store", type=positive_int,
+                        default=READ_QUEUE_SIZE, metavar="N",
+                        help="max files read ahead of the checker")
+    parser.add_argument("--shard", action="store", type=parse_shard,
+                        metavar="i/N",
+                        help="only check shard i of N of the found files")
+    parser.add_argument("--shard_strategy", action="store",
+                        choices=SHARD_STRATEGIES, default="hash",
+                        help="split shards by path hash or by file size")
+    parser.add_argument("-j", "--jobs", action="store", type=positive_int,
+                        default=1, help="number of worker processes")
+    parser.add_argument("--chunk_size", action="store", type=positive_int,
+                        default=DEFAULT_CHUNK_SIZE, metavar="bytes",
+                        help="split files bigger than this between workers")
+    parser.add_argument("--baseline", action="store", metavar="filename",
+                        help="only report fails not in the baseline file, "
+                             "the file is created if it does not exist")
+    parser.add_argument("--update_baseline", action="store_true",
+                        help="rewrite the baseline file with current fails")
+    parser.add_argument("--rev", action="store", metavar="commit",
+                        help="check files as they are in a git commit "
+                             "without checking it out")
+    parser.add_argument("--rules", action="store", type=parse_rules,
+                        default=("line_length",), metavar="rule,rule",
+                        help=f"rules to check, from {', '.join(RULE_NAMES)}")
+    parser.add_argument("--stats", action="store_true",
+                        help="show how many lines and files fail at common "
+                             "line lengths instead of checking")
+    parser.add_argument("--fix", action="store_true",
+                        help="wrap long comments and docstrings and split "
+                             "long strings in place")
+    parser.add_argument("--progress", action="store_true",
+                        help="show files and bytes per second on stderr")
+    parser.add_argument("--metrics_out", "--metrics-out", action="store",
+                        metavar="filename",
+                        help="write run metrics as OpenMetrics text")
+    parser.add_argument("--summary_json", "--summary-json",
+                        action="store_true",
+                        help="print a one line json summary to stderr")
     parser.add_argument("--no_color", dest="color", action="store_false",
                         help="turn off color output")
     parser.add_argument("--version", action="version",
                         version=f"Version: {version}")
+    args = parser.parse_args(argv)
+    if not args.thresholds:
+        args.thresholds = [(DEFAULT_LINE_LENGTH, "error")]
+    args.thresholds.sort()
+    # lines over the smallest threshold are fail lines
+    args.line_length = args.thresholds[0][0]
+    return args
+
+
+def merge_argument_parsing(argv: Optional[Sequence[str]] = None
+                           ) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="line_checker merge",
+        description="Merge json results from sharded runs.")
+    parser.add_argument("results", type=str, nargs="+",
+                        help="json results files to merge")
+    parser.add_argument("-q", dest="quiet_mode", action="store_true",
+                        help="Quiet mode. No output unless fail or error")
+    parser.add_argument("-S", dest="save_to_file", action="store_true",
+                        help="Save output to file")
+    parser.add_argument("--out_file", action="store", metavar="filename",
+                        help="file name to save results to")
+    parser.add_argument("--json_out", action="store", metavar="filename",
+                        help="save merged results as json")
+    parser.add_argument("--no_color", dest="color", action="store_false",
+                        help="turn off color output")
     return parser.parse_args(argv)
 
 
+def merge_main(argv: Optional[Sequence[str]] = None) -> int:
+    args = merge_argument_parsing(argv)
+    display = Display(False, args.color, args.quiet_mode)
+    display.welcome()
+    try:
+        file_list, fails, errors, thresholds, shard_exit_code = \
+            merge_results(args.results)
+    except (OSError, LineCheckerError) as e:
+        display.error(f"Error merging results: {e}")
+        return EXIT_IO_ERROR
+    for file, error in errors:
+        display.error(f"Error reading {file}: {error}")
+    display.summary(len(file_list) - len(errors),
+                    failed_files(fails, thresholds), 0.0)
+    severities = severity_counts(fails, thresholds)
+    if len(thresholds) > 1:
+        display.severity_summary(severities)
+    for fail_file, fail_lines in fails:
+        display.failed_details(fail_file, fail_lines, thresholds)
+    if args.save_to_file:
+        save_results_to_file(file_list, fails, args.out_file)
+    if errors:
+        exit_code = EXIT_IO_ERROR
+    elif severities.get("error"):
+        exit_code = EXIT_VIOLATIONS
+    else:
+        exit_code = EXIT_OK
+    # the worst of the shards, a shard exit code is never lost
+    exit_code = max(exit_code, shard_exit_code)
+    if args.json_out:
+        save_results_to_json(file_list, fails, args.json_out, errors,
+                             exit_code, thresholds)
+    return exit_code
+
+
+def utf16_to_index(line: str, character: int) -> int:
+    # lsp positions count utf-16 code units, python strings code points
+    if utf16_length(line) == len(line):
+        return min(character, len(line))
+    units = 0
+    for index, char in enumerate(line):
+        if units >= character:
+            return index
+        units += 2 if ord(char) > 0xFFFF else 1
+    return len(line)
+
+
+def utf16_length(line: str) -> int:
+    return len(line.encode("utf-16-le", "surrogatepass")) // 2
+
+
+class TextDocument:
+    """ Lines of an open editor buffer and which of them are too long.
+
+    Edits only measure the lines they touch, the indexes of the long lines
+    after the edit are shifted.
+    """
+    def __init__(self, text: str, line_length: int) -> None:
+        self.line_length = line_length
+        self.set_text(text)
+
+    def set_text(self, text: str) -> None:
+        self.lines = LSP_NEWLINE.split(text)
+        self.long_lines = [line for line, _ in
+                           checker(self.lines, self.line_length)]
+
+    def apply_change(self, change: Dict[str, Any]) -> None:
+        if "range" not in change:
+            self.set_text(change["text"])
+            return None
+        start = change["range"]["start"]
+        end = change["range"]["end"]
+        start_line = min(start["line"], len(self.lines) - 1)
+        end_line = min(end["line"], len(self.lines) - 1)
+        before = self.lines[start_line]
+        before = before[:utf16_to_index(before, start["character"])]
+        after = self.lines[end_line]
+        after = after[utf16_to_index(after, end["character"]):]
+        new_lines = LSP_NEWLINE.split(before + change["text"] + after)
+        self.lines[start_line:end_line + 1] = new_lines
+
+        shift = len(new_lines) - (end_line - start_line + 1)
+        first = bisect.bisect_left(self.long_lines, start_line)
+        last = bisect.bisect_right(self.long_lines, end_line)
+        changed = [line + start_line for line, _ in
+                   checker(new_lines, self.line_length)]
+        self.long_lines[first:] = changed + [line + shift for line in
+                                             self.long_lines[last:]]
+
+
+class LanguageServer:
+    """ Long line diagnostics for editors over the language server protocol.
+    """
+    def __init__(self,
+                 rfile: BinaryIO,
+                 wfile: BinaryIO,
+                 thresholds: List[Tuple[int, str]],
+                 debounce: float = LSP_DEBOUNCE) -> None:
+        self.rfile = rfile
+        self.wfile = wfile
+        self.thresholds = thresholds
+        self.line_length = thresholds[0][0]
+        self.debounce = debounce
+        self.documents: Dict[str, TextDocument] = {}
+        self.timers: Dict[str, threading.Timer] = {}
+        self.lock = threading.Lock()
+        self.shutdown = False
+
+    def read_message(self) -> Optional[Dict[str, Any]]:
+        # returns None at the end of the input, raises ValueError for a
+        # message that can not be parsed
+        length = None
+        while True:
+            header = self.rfile.readline()
+            if not header:
+                return None
+            header = header.strip()
+            if not header:
+                break
+            name, _, value = header.decode("ascii", "replace").partition(":")
+            if name.lower() == "content-length":
+                try:
+                    length = int(value)
+                except ValueError:
+                    length = None
+        if length is None or length < 0:
+            raise ValueError("missing or bad Content-Length header")
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    def send(self, message: Dict[str, Any]) -> None:
+        message["jsonrpc"] = "2.0"
+        body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        with self.lock:
+            self.wfile.write(f"Content-Length: {len(body)}\r\n\r\n".encode()
+                             + body)
+            self.wfile.flush()
+
+    def diagnostics(self, uri: str) -> List[Dict[str, Any]]:
+        document = self.documents[uri]
+        diagnostics = []
+        for line in document.long_lines:
+            text = document.lines[line]
+            length = len(text)
+            start = utf16_length(text[:self.line_length])
+            level = severity(length, self.thresholds)
+            diagnostics.append({
+                "range": {"start": {"line": line, "character": start},
+                          "end": {"line": line,
+                                  "character": utf16_length(text)}},
+                "severity": LSP_SEVERITY[level],
+                "source": "line_checker",
+                "message": f"line too long ({length} > {self.line_length})",
+            })
+        return diagnostics
+
+    def publish(self, uri: str) -> None:
+        with self.lock:
+            self.timers.pop(uri, None)
+            if uri not in self.documents:
+                return None
+            diagnostics = self.diagnostics(uri)
+        self.send({"method": "textDocument/publishDiagnostics",
+                   "params": {"uri": uri, "diagnostics": diagnostics}})
+
+    def schedule_publish(self, uri: str) -> None:
+        # wait for typing to pause before publishing
+        if self.debounce <= 0:
+            self.publish(uri)
+            return None
+        with self.lock:
+            timer = self.timers.pop(uri, None)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.debounce, self.publish, (uri,))
+            timer.daemon = True
+            self.timers[uri] = timer
+        timer.start()
+
+    def handle(self, message: Dict[str, Any]) -> bool:
+        # returns False when the server should stop
+        method = message.get("method")
+        params = message.get("params") or {}
+        result: Any = None
+        if method == "initialize":
+            result = {"capabilities": {"textDocumentSync": {"openClose": True,
+                                                            "change": 2}},
+                      "serverInfo": {"name": "line_checker",
+                                     "version": version}}
+        elif method == "shutdown":
+            self.shutdown = True
+        elif method == "exit":
+            return False
+        elif method == "textDocument/didOpen":
+            document = params["textDocument"]
+            with self.lock:
+                self.documents[document["uri"]] = TextDocument(
+                    document["text"], self.line_length)
+            self.schedule_publish(document["uri"])
+        elif method == "textDocument/didChange":
+            uri = params["textDocument"]["uri"]
+            with self.lock:
+                for change in params["contentChanges"]:
+                    self.documents[uri].apply_change(change)
+            self.schedule_publish(uri)
+        elif method == "textDocument/didClose":
+            uri = params["textDocument"]["uri"]
+            with self.lock:
+                self.documents.pop(uri, None)
+            self.send({"method": "textDocument/publishDiagnostics",
+                       "params": {"uri": uri, "diagnostics": []}})
+        elif "id" in message and method is not None:
+            self.send({"id": message["id"],
+                       "error": {"code": -32601,
+                                 "message": f"unknown method {method}"}})
+            return True
+        if "id" in message:
+            self.send({"id": message["id"], "result": result})
+        return True
+
+    def serve(self) -> int:
+        # a bad message must not end the editor session. requests get a
+        # json-rpc error and bad notifications are dropped
+        while True:
+            try:
+                message = self.read_message()
+            except ValueError as e:
+                self.send({"id": None,
+                           "error": {"code": -32700,
+                                     "message": f"parse error: {e}"}})
+                continue
+            if message is None:
+                break
+            if not isinstance(message, dict):
+                self.send({"id": None,
+                           "error": {"code": -32600,
+                                     "message": "invalid request"}})
+                continue
+            try:
+                if not self.handle(message):
+                    break
+            except (KeyError, TypeError, ValueError, AttributeError,
+                    IndexError) as e:
+                if "id" in message:
+                    self.send({"id": message["id"],
+                               "error": {"code": -32602,
+                                         "message": f"invalid params: {e!r}"}})
+        return EXIT_OK if self.shutdown else EXIT_VIOLATIONS
+
+
+def lsp_argument_parsing(argv: Optional[Sequence[str]] = None
+                         ) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="line_checker lsp",
+        description="Language server giving long line diagnostics over "
+                    "stdio.")
+    parser.add_argument("-l", dest="thresholds", action="append",
+                        type=parse_threshold, metavar="length[:severity]",
+                        help="max line length, severity is warn or error "
+                             "(default error). can be given more than once")
+    args = parser.parse_args(argv)
+    if not args.thresholds:
+        args.thresholds = [(DEFAULT_LINE_LENGTH, "error")]
+    args.thresholds.sort()
+    return args
+
+
+def lsp_main(argv: Optional[Sequence[str]] = None) -> int:
+    args = lsp_argument_parsing(argv)
+    server = LanguageServer(sys.stdin.buffer, sys.stdout.buffer,
+                            args.thresholds)
+    return server.serve()
+
+
 def main(argv: Optional[Sequence[str]] = None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == "merge":
+        return merge_main(argv[1:])
+    if argv and argv[0] == "lsp":
+        return lsp_main(argv[1:])
+
     elapse_timer = ElapseTime()
     args = argument_parsing(argv)
     display = Display(args.elapse_time, args.color, args.quiet_mode)
 
+    if args.fix and is_archive(args.file):
+        display.error("Error --fix can not be used on an archive")
+        return EXIT_USAGE
+    if args.rev and (args.fix or args.baseline):
+        display.error("Error --fix and --baseline can not be used with --rev")
+        return EXIT_USAGE
+    extra_rules = tuple(rule for rule in args.rules if rule != "line_length")
+    if extra_rules and (args.rev or is_archive(args.file)):
+        display.error("Error --rules can only check files on disk")
+        return EXIT_USAGE
+    if extra_rules and (args.jobs > 1 or args.max_memory is not None
+                        or args.max_file_size is not None):
+        display.error("Error --rules can not be used with -j, --max_memory "
+                      "or --max_file_size")
+        return EXIT_USAGE
+    if args.index and is_archive(args.file):
+        display.error("Error --index can not be used on an archive")
+        return EXIT_USAGE
+
     elapse_timer.start()
     display.welcome()
+    metrics = Metrics() if args.metrics_out else None
+    if metrics is not None:
+        metrics.start_stage("discovery")
 
     fail_count = 0
-    fails = []
+    fails = FailResults()
     check_count = 0
+    error_count = 0
+    read_errors: List[Tuple[str, str]] = []
+    baseline = None
+    baseline_keys: List[int] = []
+    record_baseline = False
+
+    if args.baseline:
+        record_baseline = (args.update_baseline
+                           or not os.path.exists(args.baseline))
+        if not record_baseline:
+            try:
+                baseline = Baseline.load(args.baseline)
+            except (OSError, LineCheckerError) as e:
+                display.error(f"Error loading baseline: {e}")
+                return EXIT_IO_ERROR
+    # fail line texts for baseline keys are kept from the check
+    texts: Optional[Dict[str, LineTexts]] = {} if args.baseline else None
+    index = None
+    if args.index:
+        try:
+            index = ScanIndex.load(args.index, {
+                "line_length": args.line_length, "rules": args.rules,
+                "follow_symlinks": args.follow_symlinks})
+        except (OSError, LineCheckerError) as e:
+            display.error(f"Error loading index: {e}")
+            return EXIT_IO_ERROR
 
+    limits = ResourceLimits(args.max_memory, args.max_file_size,
+                            args.large_files, args.queue_size)
+    git_shas: Dict[str, str] = {}
+    sizes: Dict[str, int] = {}
+    found_files: Iterator[str] = iter(())
+    # tar members are picked while the stream is checked unless the whole
+    # list is needed first
+    tar_stream = (is_archive(args.file) and args.file.endswith(TAR_EXTENSIONS)
+                  and not (args.rev or args.shard or args.stats))
     try:
-        files_to_check = discovery(args.file, ["python"])
-    except ValueError:
-        display.error("Error file not found during discovery")
+        if args.rev:
+            git_shas = git_discovery(args.file, args.rev, ["python"], sizes)
+            files_to_check = list(git_shas)
+        elif index is not None:
+            files_to_check = index_discovery(
+                args.file, ["python"], index, bool(args.discovery_threads),
+                args.follow_symlinks)
+        elif tar_stream:
+            files_to_check = []
+        elif args.discovery_threads:
+            found_files = parallel_discovery(
+                args.file, ["python"], args.discovery_threads,
+                follow_symlinks=args.follow_symlinks)
+        else:
+            files_to_check = discovery(args.file, ["python"],
+                                       args.follow_symlinks)
+    except (ValueError, LineCheckerError) as e:
+        if isinstance(e, LineCheckerError):
+            display.error(f"Error reading revision {args.rev}: {e}")
+        else:
+            display.error("Error file not found during discovery")
         elapse_timer.stop()
         display.summary(0, 0, elapse_timer.elapse_time())
-        return 1
+        if args.summary_json:
+            summary_json(0, 0, 0, 1, 0, elapse_timer.elapse_time(),
+                         EXIT_IO_ERROR)
+        return EXIT_IO_ERROR
     else:
-        for file in files_to_check:
-            file_data = load_file(file)
-            fail_lines = checker(file_data, args.line_length)
+        # files found by parallel discovery go straight to the checker
+        # unless the whole list is needed first
+        stream_files = (args.discovery_threads and not args.rev
+                        and not is_archive(args.file) and index is None
+                        and not (args.shard or args.stats or args.jobs > 1))
+        if (args.discovery_threads and not args.rev and index is None
+                and not stream_files):
+            files_to_check = list(found_files)
+        if args.shard:
+            files_to_check = shard_files(files_to_check, *args.shard,
+                                         strategy=args.shard_strategy)
+        if args.stats:
+            if args.rev:
+                with GitBlobReader(git_repo_dir(args.file)) as reader:
+                    def load_blob(file: str) -> List[str]:
+                        data = reader.read(git_shas[file])
+                        return data.decode(
+                            locale.getpreferredencoding(False)).splitlines()
+                    stats, error_count = line_length_stats(files_to_check,
+                                                           load_blob)
+            else:
+                stats, error_count = line_length_stats(files_to_check)
+            limits = sorted(set(STATS_LIMITS) | {args.line_length})
+            display.stats(stats, limits)
+            return EXIT_IO_ERROR if error_count else EXIT_OK
+        if metrics is not None:
+            metrics.stop_stage("discovery")
+            metrics.start_stage("check")
+        results: Iterable[CheckResult]
+        groups: Dict[str, List[str]] = {}
+        git_reader = None
+        cache: Optional[ContentCache] = None
+        if args.rev:
+            git_reader = GitBlobReader(git_repo_dir(args.file), index)
+            results = check_git_blobs(files_to_check, git_shas, git_reader,
+                                      args.line_length)
+        elif tar_stream:
+            results = check_tar(
+                args.file,
+                functools.partial(wanted_member, tags_to_find=["python"]),
+                args.line_length, files_to_check, metrics, sizes, texts)
+        elif is_archive(args.file):
+            results = check_archive(args.file, files_to_check,
+                                    args.line_length, args.jobs, metrics,
+                                    sizes, texts)
+        elif stream_files:
+            files_to_check = []
+            if extra_rules:
+                check = functools.partial(check_rules, rules=args.rules)
+            elif limits.active():
+                check = functools.partial(check_files_limited, limits=limits)
+            else:
+                check = check_files
+            # sizes are not known up front, only hard links are found
+            check = functools.partial(check, line_length=args.line_length,
+                                      metrics=metrics, texts=texts)
+            results = check_once(_record(found_files, files_to_check), check,
+                                 args.follow_symlinks, sizes, texts)
+        else:
+            saved: List[CheckResult] = []
+            to_check = files_to_check
+            if index is not None:
+                saved, to_check = index.lookup(files_to_check)
+            sizes = file_sizes(to_check)
+            groups = group_identical(to_check, sizes)
+            # files with the same contents are checked once
+            cache = ContentCache(sizes[file] for file in groups)
+            if extra_rules:
+                results = check_rules(list(groups), args.line_length,
+                                      args.rules, metrics, cache, texts)
+            elif args.jobs > 1:
+                # chunks are read a piece at a time in the workers so
+                # only hard links are grouped
+                chunk_size = args.chunk_size
+                if limits.max_memory is not None:
+                    chunk_size = max(1, min(chunk_size,
+                                            limits.max_memory // args.jobs))
+                results = parallel_checker(
+                    limits.skip_large_files(list(groups), sizes),
+                    args.line_length, args.jobs, chunk_size, sizes, metrics,
+                    texts)
+            elif limits.active():
+                results = check_files_limited(list(groups), args.line_length,
+                                              limits, metrics, cache, texts)
+            else:
+                results = check_files(list(groups), args.line_length,
+                                      metrics, cache, texts)
+            results = fan_out(results, groups, texts)
+            if index is not None:
+                results = itertools.chain(saved, index.record(results))
+        progress = None
+        if args.progress:
+            progress = Progress()
+            progress.start()
+        for file, fail_lines, error in results:
+            if progress is not None:
+                progress.files_found = len(files_to_check)
+                # sizes come from the stat done before checking, or from
+                # the archive or git for members and blobs
+                progress.file_done(sizes.get(file, 0))
+            if error is not None:
+                error_count += 1
+                read_errors.append((file, error))
+                display.error(f"Error reading {file}: {error}")
+                continue
             check_count += 1
+            line_texts = texts.pop(file, None) if texts is not None else None
+            if fail_lines and record_baseline:
+                baseline_keys.extend(violation_keys(file, fail_lines,
+                                                    line_texts))
+                fail_lines = []
+            elif fail_lines and baseline is not None:
+                fail_lines = filter_baseline(file, fail_lines, baseline,
+                                             line_texts)
             if fail_lines:
                 fail_count += 1
-                fails.append((file, fail_lines))
+                fails.add(file, fail_lines)
         else:
+            if progress is not None:
+                progress.stop()
+            if git_reader is not None:
+                git_reader.close()
+            if index is not None:
+                try:
+                    index.save()
+                except (OSError, sqlite3.Error) as e:
+                    display.error(f"Error saving index: {e}")
+            if metrics is not None:
+                metrics.stop_stage("check")
+                if args.jobs > 1 and not args.rev and groups:
+                    metrics.workers = args.jobs
+                else:
+                    metrics.busy_time = metrics.stages["check"]
+                metrics.cache_hits = (len(files_to_check) - len(groups)
+                                      if groups or index else 0)
+                if cache is not None:
+                    metrics.cache_hits += cache.hits
+                if git_reader is not None:
+                    metrics.cache_hits = git_reader.cache_hits
+                    metrics.lines = git_reader.lines
+                metrics.start_stage("report")
+            if record_baseline:
+                Baseline(baseline_keys).save(args.baseline)
+                display.info(f"Baseline saved to {args.baseline} with "
+                             f"{len(baseline_keys)} fail lines")
+            if args.fix and fail_count:
+                fixed = fix_files(fails, args.line_length, args.jobs)
+                display.info(f"Fixed {sum(fixed.values())} lines in "
+                             f"{sum(1 for n in fixed.values() if n)} files")
+                remaining = FailResults()
+                for file, fail_lines in fails:
+                    fail_lines = list(fail_lines)
+                    if fixed[file] and extra_rules:
+                        # fixing long lines leaves the other rule fails
+                        fixed_texts: Dict[str, LineTexts] = {}
+                        _, fail_lines, _ = next(check_rules(
+                            [file], args.line_length, args.rules,
+                            texts=fixed_texts))
+                        line_texts = fixed_texts.get(file, {})
+                    elif fixed[file]:
+                        line_texts = {}
+                        fail_lines = checker(load_file(file), args.line_length,
+                                             line_texts)
+                    if fixed[file] and baseline is not None:
+                        fail_lines = filter_baseline(file, fail_lines,
+                                                     baseline, line_texts)
+                    if fail_lines:
+                        remaining.add(file, fail_lines)
+                fails = remaining
+                fail_count = len(fails)
+            for file in limits.skipped:
+                display.info(f"Skipped {file}: bigger than "
+                             f"{limits.file_limit()} bytes")
+            for file in limits.streamed:
+                display.info(f"Streamed {file}: bigger than "
+                             f"{limits.file_limit()} bytes")
+            fails = fails.sorted()
             elapse_timer.stop()
+            fail_count = failed_files(fails, args.thresholds)
             display.summary(check_count, fail_count, elapse_timer.elapse_time())
-            if fail_count > 0:
-                for fail_file in fails:
-                    display.failed_details(fail_file[0], fail_file[1])
+            severities = severity_counts(fails, args.thresholds)
+            if len(args.thresholds) > 1:
+                display.severity_summary(severities)
+            if fails:
+                for fail_file, fail_lines in fails:
+                    display.failed_details(fail_file, fail_lines,
+                                           args.thresholds)
             if args.save_to_file:
                 save_results_to_file(files_to_check, fails, args.out_file)
-            return 0
+            if error_count:
+                exit_code = EXIT_IO_ERROR
+            elif severities.get("error"):
+                # warnings are reported but do not fail the run
+                exit_code = EXIT_VIOLATIONS
+            else:
+                exit_code = EXIT_OK
+            if args.json_out:
+                save_results_to_json(files_to_check, fails, args.json_out,
+                                     read_errors, exit_code, args.thresholds)
+            if args.summary_json or metrics is not None:
+                if args.rev or is_archive(args.file):
+                    # members and blobs are not on disk, their sizes come
+                    # from the archive or git
+                    total_bytes = sum(sizes.get(file, 0)
+                                      for file in files_to_check)
+                else:
+                    total_bytes = sum(file_sizes(files_to_check).values())
+            if args.summary_json:
+                summary_json(check_count, fail_count,
+                             fails.num_violations(),
+                             error_count,
+                             total_bytes,
+                             elapse_timer.elapse_time(), exit_code,
+                             severities)
+            if metrics is not None:
+                metrics.stop_stage("report")
+                metrics.files = check_count
+                metrics.bytes = total_bytes
+                metrics.add_violations(fails)
+                metrics.save(args.metrics_out)
+            return exit_code
 
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+import tarfile
+import zipfile
+
+import pytest
+
+from line_checker import line_checker
+
+LONG_LINE = "# " + "x" * 90 + "\n"
+MEMBERS = {
+    "pkg/__init__.py": "",
+    "pkg/long.py": "import os\n" + LONG_LINE,
+    "pkg/ok.py": "print('ok')\n",
+    "pkg/README.md": LONG_LINE,
+}
+
+
+@pytest.fixture
+def make_archive(tmpdir):
+    def _make_archive(filename):
+        path = tmpdir.join(filename).strpath
+        if filename.endswith((".zip", ".whl")):
+            with zipfile.ZipFile(path, "w") as zf:
+                for name, data in MEMBERS.items():
+                    zf.writestr(name, data)
+        else:
+            for name, data in MEMBERS.items():
+                tmpdir.join(name).ensure().write(data)
+            with tarfile.open(path, "w:gz") as tf:
+                for name in MEMBERS:
+                    tf.add(tmpdir.join(name).strpath, arcname=name)
+        return path
+    return _make_archive
+
+
+@pytest.mark.parametrize("filename", ["foo.zip", "foo.whl", "foo.tar.gz"])
+def test_discovery_archive(make_archive, filename):
+    path = make_archive(filename)
+    result = line_checker.discovery(path, ["python"])
+    assert sorted(result) == [f"{path}::pkg/__init__.py",
+                              f"{path}::pkg/long.py",
+                              f"{path}::pkg/ok.py"]
+
+
+@pytest.mark.parametrize("filename", ["foo.zip", "foo.tar.gz"])
+def test_load_file_archive_member(make_archive, filename):
+    path = make_archive(filename)
+    result = line_checker.load_file(f"{path}::pkg/long.py")
+    assert result == ["import os", LONG_LINE.rstrip("\n")]
+
+
+@pytest.mark.parametrize("filename", ["foo.zip", "foo.tar.gz"])
+@pytest.mark.parametrize("options", [[], ["-j3"]])
+def test_main_archive(make_archive, capsys, filename, options):
+    path = make_archive(filename)
+    result = line_checker.main([path, "--no_color"] + options)
+    captured_output = capsys.readouterr().out
+    assert captured_output == (
+        "Line Checker\n3 files checked: 2 Passed, 1 Failed\n"
+        f"{path}::pkg/long.py\n  line: 2  -  length: 92\n"
+    )
+    assert result == line_checker.EXIT_VIOLATIONS
+
+
+def test_main_archive_fix(make_archive, capsys):
+    path = make_archive("foo.zip")
+    result = line_checker.main([path, "--no_color", "--fix"])
+    assert "can not be used on an archive" in capsys.readouterr().out
+    assert result == line_checker.EXIT_USAGE
+
+
+def test_main_bad_archive(make_test_file, capsys):
+    tf = make_test_file("foo.zip", "not a zip file")
+    result = line_checker.main([tf, "--no_color"])
+    assert "Error file not found during discovery" in capsys.readouterr().out
+    assert result == line_checker.EXIT_IO_ERROR
+
+
+def test_main_tar_single_pass(make_archive, capsys, monkeypatch):
+    path = make_archive("foo.tar.gz")
+    opened = []
+    tar_open = tarfile.open
+
+    def counting_open(*args, **kwargs):
+        opened.append(args)
+        return tar_open(*args, **kwargs)
+    monkeypatch.setattr(tarfile, "open", counting_open)
+    result = line_checker.main([path, "--no_color"])
+    assert "3 files checked: 2 Passed, 1 Failed" in capsys.readouterr().out
+    assert result == line_checker.EXIT_VIOLATIONS
+    assert len(opened) == 1
+
+
+def test_main_truncated_tar(make_archive, capsys):
+    path = make_archive("foo.tar.gz")
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:len(data) // 2])
+    result = line_checker.main([path, "--no_color"])
+    captured_output = capsys.readouterr().out
+    assert "Error reading" in captured_output
+    assert "Traceback" not in captured_output
+    assert result == line_checker.EXIT_IO_ERROR
+
+
+@pytest.mark.parametrize("filename", ["foo.zip", "foo.tar.gz"])
+def test_main_archive_metrics(make_archive, capsys, filename):
+    path = make_archive(filename)
+    result = line_checker.main([path, "-q", "--metrics-out", path + ".prom",
+                                "--summary-json"])
+    assert result == line_checker.EXIT_VIOLATIONS
+    with open(path + ".prom") as f:
+        lines = f.read().splitlines()
+    num_bytes = sum(len(data) for name, data in MEMBERS.items()
+                    if name.endswith(".py"))
+    assert f"line_checker_bytes {num_bytes}" in lines
+    assert "line_checker_lines 3" in lines
+    assert f'"bytes":{num_bytes},' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("filename", ["foo.zip", "foo.tar.gz"])
+def test_main_archive_baseline(make_archive, capsys, monkeypatch, filename):
+    path = make_archive(filename)
+    argv = [path, "--no_color", "--baseline", path + ".baseline"]
+    opened = []
+    tar_open = tarfile.open
+
+    def counting_open(*args, **kwargs):
+        opened.append(args)
+        return tar_open(*args, **kwargs)
+    monkeypatch.setattr(tarfile, "open", counting_open)
+    monkeypatch.setattr(line_checker, "open_archive_member", None)
+    assert line_checker.main(argv) == line_checker.EXIT_OK
+    assert "with 1 fail lines" in capsys.readouterr().out
+    assert line_checker.main(argv) == line_checker.EXIT_OK
+    assert len(opened) == (2 if filename.endswith(".tar.gz") else 0)
@@ -83,3 +83,21 @@ def test_argument_parsing_save_file_name_no_file_entered(capsys):
         line_checker.argument_parsing(["foo.py", "--out_file"])
     captured_output = capsys.readouterr().err
     assert "--out_file: expected one argument" in captured_output
+
+
+@pytest.mark.parametrize("test_args, expected_result", [
+    (["test.py"], [(80, "error")]),
+    (["test.py", "-l100"], [(100, "error")]),
+    (["test.py", "-l", "120:error", "-l", "88:warn"],
+     [(88, "warn"), (120, "error")]),
+])
+def test_argument_parsing_thresholds(test_args, expected_result):
+    result = line_checker.argument_parsing(test_args)
+    assert result.thresholds == expected_result
+    assert result.line_length == expected_result[0][0]
+
+
+@pytest.mark.parametrize("value", ["88:fatal", "x:warn", "abc"])
+def test_argument_parsing_thresholds_invalid(value):
+    with pytest.raises(SystemExit):
+        line_checker.argument_parsing(["test.py", "-l", value])
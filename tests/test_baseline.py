@@ -0,0 +1,86 @@
+from unittest import mock
+
+import pytest
+
+from line_checker import line_checker
+
+LONG_LINE = "# " + "x" * 90 + "\n"
+
+
+def test_baseline_save_load(tmpdir):
+    keys = [5, 2**64 - 1, 3, 5]
+    filename = tmpdir.join("baseline").strpath
+    line_checker.Baseline(keys).save(filename)
+    baseline = line_checker.Baseline.load(filename)
+    assert list(baseline.keys) == [3, 5, 2**64 - 1]
+    assert 5 in baseline
+    assert 4 not in baseline
+    assert 2**64 - 1 in baseline
+
+
+def test_violation_key_depends_on_file_and_line():
+    key = line_checker.violation_key("foo.py", LONG_LINE)
+    assert key == line_checker.violation_key("foo.py", LONG_LINE)
+    assert key != line_checker.violation_key("bar.py", LONG_LINE)
+    assert key != line_checker.violation_key("foo.py", LONG_LINE + "x")
+
+
+def test_main_baseline_only_reports_new_fails(make_test_file, capsys):
+    tf = make_test_file("foo.py", LONG_LINE + "print('hi')\n")
+    baseline_file = tf + ".baseline"
+    result = line_checker.main([tf, "--no_color",
+                                "--baseline", baseline_file])
+    captured_output = capsys.readouterr().out
+    assert f"Baseline saved to {baseline_file} with 1 fail lines" in \
+        captured_output
+    assert result == line_checker.EXIT_OK
+
+    # old long line moved down, new long line added
+    new_line = "# " + "y" * 85 + "\n"
+    with open(tf, "w") as f:
+        f.write("import os\n\n" + LONG_LINE + new_line)
+    result = line_checker.main([tf, "--no_color",
+                                "--baseline", baseline_file])
+    captured_output = capsys.readouterr().out
+    assert captured_output == ("Line Checker\n1 files checked: Failed\n"
+                               f"{tf}\n  line: 4  -  length: 87\n")
+    assert result == line_checker.EXIT_VIOLATIONS
+
+
+@pytest.mark.parametrize("contents", ["not a baseline", "LCBASE1\nabc"])
+def test_main_baseline_not_baseline_file(make_test_file, capsys, contents):
+    tf = make_test_file("foo.py", LONG_LINE)
+    bad = make_test_file("bad", contents)
+    result = line_checker.main([tf, "--no_color", "--baseline", bad])
+    assert "Error loading baseline" in capsys.readouterr().out
+    assert result == line_checker.EXIT_IO_ERROR
+
+
+@pytest.mark.parametrize("options", [
+    [], ["-j2"], ["--max_file_size", "10"], ["--max_memory", "1M"],
+    ["--rules", "line_length,tabs"], ["--discovery_threads", "2"],
+])
+def test_main_baseline_does_not_read_files_again(make_temp_directory,
+                                                 capsys, options):
+    td = make_temp_directory()
+    td.add_file("a.py", LONG_LINE + "print('hi')\n")
+    td.add_file("b.py", LONG_LINE + "print('hi')\n")
+    argv = [".", "--no_color", "--baseline", "baseline"] + options
+    with mock.patch.object(line_checker, "read_lines") as read_lines:
+        assert line_checker.main(argv) == line_checker.EXIT_OK
+        assert "with 2 fail lines" in capsys.readouterr().out
+    read_lines.assert_not_called()
+
+    with open("b.py", "a") as f:
+        f.write("# " + "y" * 85 + "\n")
+    assert line_checker.main(argv) == line_checker.EXIT_VIOLATIONS
+    assert capsys.readouterr().out.endswith(
+        "b.py\n  line: 3  -  length: 87\n")
+
+
+def test_violation_keys_reads_only_missing_texts(make_test_file):
+    tf = make_test_file("foo.py", "x = 1\n" + LONG_LINE)
+    key = line_checker.violation_key(tf, LONG_LINE.rstrip("\n"))
+    assert line_checker.violation_keys(tf, [(1, 92)]) == [key]
+    assert line_checker.violation_keys(
+        tf, [(1, 92)], {1: LONG_LINE.rstrip("\n")}) == [key]
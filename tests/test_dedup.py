@@ -0,0 +1,113 @@
+import os
+from unittest import mock
+
+import pytest
+
+from line_checker import line_checker
+
+LONG_LINE = "# " + "x" * 90 + "\n"
+
+
+def test_group_identical_reads_nothing(make_temp_directory):
+    td = make_temp_directory()
+    td.add_file("a.py", LONG_LINE)
+    td.add_file("b.py", LONG_LINE)
+    td.add_file("c.py", "print('unique size')\n")
+    files = ["a.py", "b.py", "c.py"]
+    sizes = line_checker.file_sizes(files)
+    with mock.patch("builtins.open") as opened:
+        result = line_checker.group_identical(files, sizes)
+    opened.assert_not_called()
+    assert result == {"a.py": ["a.py"], "b.py": ["b.py"], "c.py": ["c.py"]}
+
+
+@pytest.mark.parametrize("check", [
+    lambda files, cache: line_checker.check_files(files, 80, None, cache),
+    lambda files, cache: line_checker.check_files_limited(
+        files, 80, line_checker.ResourceLimits(max_memory=1024), None,
+        cache),
+    lambda files, cache: line_checker.check_rules(
+        files, 80, ("line_length", "tabs"), None, cache),
+])
+def test_content_cache_reads_each_file_once(make_temp_directory, check):
+    td = make_temp_directory()
+    td.add_file("a.py", LONG_LINE)
+    td.add_file("b.py", "# " + "y" * 90 + "\n")
+    td.add_file("c.py", LONG_LINE)
+    td.add_file("d.py", "print('unique size')\n")
+    files = ["a.py", "b.py", "c.py", "d.py"]
+    cache = line_checker.ContentCache(line_checker.file_sizes(files).values())
+    real_open = open
+    with mock.patch("builtins.open", side_effect=real_open) as opened, \
+            mock.patch.object(line_checker, "checker",
+                              wraps=line_checker.checker) as checked, \
+            mock.patch.object(line_checker.hashlib, "blake2b",
+                              wraps=line_checker.hashlib.blake2b) as hashed:
+        results = list(check(files, cache))
+    assert sorted(c.args[0] for c in opened.call_args_list) == files
+    assert checked.call_count == 3
+    assert cache.hits == 1
+    # the file with a unique size is neither hashed nor kept
+    assert hashed.call_count == 3
+    assert len(cache.results) == 2
+    assert [(file, list(fails)) for file, fails, _ in results] == [
+        ("a.py", [(0, 92)]), ("b.py", [(0, 92)]), ("c.py", [(0, 92)]),
+        ("d.py", [])]
+
+
+def test_group_identical_hard_links(make_temp_directory):
+    td = make_temp_directory()
+    td.add_file("a.py", LONG_LINE)
+    os.link("a.py", "b.py")
+    files = ["a.py", "b.py"]
+    sizes = line_checker.file_sizes(files)
+    with mock.patch("builtins.open") as opened:
+        result = line_checker.group_identical(files, sizes)
+    assert result == {"a.py": ["a.py", "b.py"]}
+    opened.assert_not_called()
+
+
+def test_check_once(make_temp_directory):
+    td = make_temp_directory()
+    td.add_file("a.py", LONG_LINE)
+    td.add_file("c.py", "print('ok')\n")
+    os.link("a.py", "b.py")
+    os.symlink("c.py", "d.py")
+    files = ["a.py", "b.py", "c.py", "d.py"]
+
+    sizes = {}
+
+    def check(follow_symlinks):
+        with mock.patch.object(line_checker, "load_file",
+                               wraps=line_checker.load_file) as loaded:
+            results = list(line_checker.check_once(
+                files, lambda found: line_checker.check_files(found, 80),
+                follow_symlinks, sizes))
+        return results, [c.args[0] for c in loaded.call_args_list]
+
+    results, loaded = check(False)
+    assert sorted(results) == [("a.py", [(0, 92)], None),
+                               ("b.py", [(0, 92)], None),
+                               ("c.py", [], None), ("d.py", [], None)]
+    assert loaded == ["a.py", "c.py", "d.py"]
+    assert sizes == {"a.py": len(LONG_LINE), "b.py": len(LONG_LINE),
+                     "c.py": 12, "d.py": 12}
+    results, loaded = check(True)
+    assert sorted(file for file, _, _ in results) == files
+    assert loaded == ["a.py", "c.py"]
+
+
+def test_main_follow_symlinks(make_temp_directory, capsys):
+    td = make_temp_directory()
+    td.add_file("a.py", LONG_LINE)
+    os.symlink("a.py", "link.py")
+    os.mkfifo("fifo.py")
+    for argv in ([".", "--no_color"], [".", "--no_color",
+                                       "--discovery_threads", "2"]):
+        assert line_checker.main(argv) == line_checker.EXIT_VIOLATIONS
+        assert "1 files checked" in capsys.readouterr().out
+        assert line_checker.main(argv + ["--follow_symlinks"]) == \
+            line_checker.EXIT_VIOLATIONS
+        out = capsys.readouterr().out
+        assert "2 files checked" in out
+        assert "./link.py" in out
@@ -1,3 +1,5 @@
+import os
+
 import pytest
 
 from line_checker import line_checker
@@ -41,3 +43,79 @@ def test_discovery_files_in_dir(make_temp_directory, files, expected_results):
     for x in expected_results:
         assert x in " ".join(result)  # TODO do this assert better
     # assert result == expected_results
+
+
+def make_tree(tmpdir):
+    for name in ["a.py", "b.txt", "sub/c.py", "sub/deep/d.py",
+                 "sub/deep/e.md", ".git/f.py", "other/__pycache__/g.py"]:
+        tmpdir.join(name).ensure()
+    return tmpdir.strpath
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_parallel_discovery(tmpdir, workers):
+    path = make_tree(tmpdir)
+    result = line_checker.parallel_discovery(path, ["python"], workers)
+    assert sorted(result) == [f"{path}/a.py", f"{path}/sub/c.py",
+                              f"{path}/sub/deep/d.py"]
+
+
+def test_parallel_discovery_small_queue(tmpdir):
+    for i in range(50):
+        tmpdir.join(f"dir{i % 5}", f"file{i}.py").ensure()
+    result = line_checker.parallel_discovery(tmpdir.strpath, ["python"], 3,
+                                             max_queued=2)
+    assert len(list(result)) == 50
+
+
+def test_parallel_discovery_single_file(make_test_file):
+    test_file = make_test_file("foo.py", "")
+    result = line_checker.parallel_discovery(test_file, ["python"])
+    assert list(result) == [test_file]
+
+
+def test_parallel_discovery_not_found(tmpdir):
+    with pytest.raises(ValueError):
+        line_checker.parallel_discovery(tmpdir.join("foo.py").strpath,
+                                        ["python"])
+
+
+def make_links(tmpdir):
+    tmpdir.join("a.py").write("")
+    tmpdir.join("sub", "b.py").ensure()
+    os.symlink("a.py", tmpdir.join("link.py").strpath)
+    os.symlink("sub", tmpdir.join("linked_dir").strpath)
+    os.symlink(tmpdir.strpath, tmpdir.join("sub", "loop").strpath)
+    os.symlink("missing.py", tmpdir.join("broken.py").strpath)
+    os.mkfifo(tmpdir.join("fifo.py").strpath)
+    return tmpdir.strpath
+
+
+def test_discovery_symlinks_and_special_files(tmpdir):
+    path = make_links(tmpdir)
+    assert line_checker.discovery(path, ["python"]) == [f"{path}/a.py"]
+    result = line_checker.discovery(path, ["python"], follow_symlinks=True)
+    assert sorted(result) == [f"{path}/a.py", f"{path}/link.py"]
+
+
+def test_discovery_fifo_path(tmpdir):
+    path = make_links(tmpdir)
+    assert line_checker.discovery(f"{path}/fifo.py", ["python"]) == []
+
+
+def test_parallel_discovery_no_follow(tmpdir):
+    path = make_links(tmpdir)
+    result = line_checker.parallel_discovery(path, ["python"], 2)
+    assert sorted(result) == [f"{path}/a.py", f"{path}/sub/b.py"]
+
+
+def test_parallel_discovery_follow_symlink_loop(tmpdir):
+    path = make_links(tmpdir)
+    result = list(line_checker.parallel_discovery(path, ["python"], 2,
+                                                  follow_symlinks=True))
+    # sub is listed once, through sub or linked_dir, and the loop back to
+    # the top directory is not followed
+    assert len(result) == 3
+    assert f"{path}/a.py" in result
+    assert f"{path}/link.py" in result
+    assert sum(file.endswith("/b.py") for file in result) == 1
@@ -0,0 +1,165 @@
+import os
+
+import pytest
+
+from line_checker import line_checker
+
+SOURCE = '''\
+""" Module docstring.
+
+This docstring line is much too long and the fix mode should wrap it to fit the limit.
+"""
+
+
+def foo(x):
+    # a comment on its own line that is far too long and should be wrapped by fix
+    print("a string literal inside a call that is far too long to fit on the line", x)
+    y = "a string literal outside of brackets can not be split safely at all, no"
+    return f"an f-string is left alone because splitting it is not safe {x} okay"
+'''
+
+FIXED = '''\
+""" Module docstring.
+
+This docstring line is much too long and the fix mode should wrap it to fit the
+limit.
+"""
+
+
+def foo(x):
+    # a comment on its own line that is far too long and should be wrapped by
+    # fix
+    print("a string literal inside a call that is far too long to fit on the "
+          "line", x)
+    y = "a string literal outside of brackets can not be split safely at all, no"
+    return f"an f-string is left alone because splitting it is not safe {x} okay"
+'''
+
+
+def test_fix_file(make_test_file):
+    tf = make_test_file("foo.py", SOURCE)
+    os.chmod(tf, 0o755)
+    fail_lines = line_checker.checker(line_checker.load_file(tf), 80)
+    result = line_checker.fix_file(tf, fail_lines, 80)
+    assert result == 3
+    with open(tf) as f:
+        assert f.read() == FIXED
+    assert os.stat(tf).st_mode & 0o777 == 0o755
+    assert os.listdir(os.path.dirname(tf)) == ["foo.py"]
+    compile(FIXED, tf, "exec")
+
+
+def test_fix_file_keeps_crlf(make_test_file):
+    tf = make_test_file("foo.py", "")
+    with open(tf, "wb") as f:
+        f.write(b"x = 1\r\n# " + b"word " * 20 + b"\r\n")
+    line_checker.fix_file(tf, [(1, 102)], 80)
+    with open(tf, "rb") as f:
+        data = f.read()
+    assert data.count(b"\r\n") == 3
+    assert b"\n" not in data.replace(b"\r\n", b"")
+
+
+def test_fix_file_nothing_to_fix(make_test_file):
+    tf = make_test_file("foo.py", "x = '" + "a" * 90 + "'\n")
+    mtime = os.stat(tf).st_mtime_ns
+    assert line_checker.fix_file(tf, [(0, 96)], 80) == 0
+    assert os.stat(tf).st_mtime_ns == mtime
+
+
+def test_fix_file_not_python(make_test_file):
+    tf = make_test_file("foo.py", "def (:\n    '''\n")
+    assert line_checker.fix_file(tf, [(0, 96)], 80) == 0
+
+
+@pytest.mark.parametrize("options", [[], ["-j2"]])
+def test_main_fix(make_temp_directory, capsys, options):
+    td = make_temp_directory()
+    td.add_file("foo.py", SOURCE)
+    td.add_file("bar.py", SOURCE)
+    test_dir = td.get_temp_directory()
+    result = line_checker.main([test_dir, "--fix", "--no_color"] + options)
+    captured_output = capsys.readouterr().out
+    assert "Fixed 6 lines in 2 files\n" in captured_output
+    assert "2 files checked: Failed\n" in captured_output
+    assert "  line: 13  -  length: 81\n" in captured_output
+    assert result == line_checker.EXIT_VIOLATIONS
+    with open("foo.py") as f:
+        assert f.read() == FIXED
+
+
+def test_main_fix_with_rules(make_temp_directory, capsys):
+    td = make_temp_directory()
+    td.add_file("foo.py", "# " + "word " * 20 + "\nx = 1   \n")
+    result = line_checker.main(["foo.py", "--fix", "--no_color", "--rules",
+                                "line_length,trailing_whitespace"])
+    captured_output = capsys.readouterr().out
+    assert "Fixed 1 lines in 1 files\n" in captured_output
+    assert "1 files checked: Failed\n" in captured_output
+    assert "foo.py\n  line: 3  -  trailing whitespace\n" in captured_output
+    assert result == line_checker.EXIT_VIOLATIONS
+
+
+DOCSTRING_SOURCE = '''\
+def foo(aaa, bbb, ccc, dddddddd):
+    """ Foo the arguments.
+
+    >>> foo(aaaaaaaaaaaa, bbbbbbbbbbbbbbb, cccccccccccccc, dddddddddddddddddddd)
+    'a result line that is long enough to go over the limit of eighty chars'
+
+    Example::
+
+        foo(aaaaaaaaaaaa, bbbbbbbbbbbbbbb, cccccccccccccc, dddddddddddddddddddd)
+
+    https://example.com/a/very/long/url/that/can/not/be/wrapped/at/all/ok
+    .. _link: https://example.com/a/very/long/url/that/should/stay/put/as/is
+    A plain text line that is long enough to need wrapping by the fix mode.
+    """
+'''
+
+
+def test_docstring_text_lines():
+    docstring = DOCSTRING_SOURCE[DOCSTRING_SOURCE.index('"""'):].rstrip()
+    # "Example::" and the plain text line
+    assert line_checker._docstring_text_lines(docstring) == [5, 11]
+
+
+def test_fix_file_skips_doctest_and_literal_blocks(make_test_file):
+    tf = make_test_file("foo.py", DOCSTRING_SOURCE)
+    fail_lines = line_checker.checker(line_checker.load_file(tf), 70)
+    assert len(fail_lines) == 6
+    assert line_checker.fix_file(tf, fail_lines, 70) == 1
+    with open(tf) as f:
+        lines = f.read().splitlines()
+    assert lines[:12] == DOCSTRING_SOURCE.splitlines()[:12]
+    assert lines[12:14] == [
+        "    A plain text line that is long enough to need wrapping by the fix",
+        "    mode.",
+    ]
+
+
+LIST_SOURCE = '''\
+def foo(x):
+    """ Foo the argument.
+
+    - a list item that is long enough to need wrapping by the fix mode here
+    12. a numbered item that is long enough to need wrapping by the fix mode
+    :param x: a field body that is long enough to need wrapping by the fix
+    """
+'''
+
+
+def test_fix_file_indents_list_items_and_fields(make_test_file):
+    tf = make_test_file("foo.py", LIST_SOURCE)
+    fail_lines = line_checker.checker(line_checker.load_file(tf), 70)
+    assert line_checker.fix_file(tf, fail_lines, 70) == 3
+    with open(tf) as f:
+        lines = f.read().splitlines()
+    assert lines[3:9] == [
+        "    - a list item that is long enough to need wrapping by the fix mode",
+        "      here",
+        "    12. a numbered item that is long enough to need wrapping by the",
+        "        fix mode",
+        "    :param x: a field body that is long enough to need wrapping by the",
+        "        fix",
+    ]
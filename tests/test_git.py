@@ -0,0 +1,121 @@
+import os
+import subprocess
+from unittest import mock
+
+import pytest
+
+from line_checker import line_checker
+
+LONG_LINE = "# " + "x" * 90 + "\n"
+
+
+def git(*args):
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=t@t",
+                    *args], check=True, stdout=subprocess.PIPE)
+
+
+@pytest.fixture
+def git_repo(make_temp_directory):
+    td = make_temp_directory()
+    git("init", "-q", ".")
+    td.add_file("foo.py", LONG_LINE)
+    td.add_file("copy.py", LONG_LINE)
+    td.add_file("bar.py", "print('ok')\n")
+    td.add_file("README.md", LONG_LINE)
+    git("add", ".")
+    git("commit", "-q", "-m", "first")
+    # fix the long lines in the work tree only
+    td.add_file("foo.py", "print('fixed')\n")
+    td.add_file("copy.py", "print('fixed')\n")
+    return td.get_temp_directory()
+
+
+def test_git_discovery(git_repo):
+    result = line_checker.git_discovery(git_repo, "HEAD", ["python"])
+    assert sorted(result) == [f"HEAD:{git_repo}/bar.py",
+                              f"HEAD:{git_repo}/copy.py",
+                              f"HEAD:{git_repo}/foo.py"]
+    assert result[f"HEAD:{git_repo}/foo.py"] == \
+        result[f"HEAD:{git_repo}/copy.py"]
+
+
+def test_git_discovery_bad_rev(git_repo):
+    with pytest.raises(line_checker.LineCheckerError, match="no-such-rev"):
+        line_checker.git_discovery(git_repo, "no-such-rev", ["python"])
+
+
+def test_main_rev_errors(git_repo, capsys):
+    result = line_checker.main([git_repo, "--no_color", "--rev", "no-such"])
+    captured_output = capsys.readouterr().out
+    assert "Error reading revision no-such: " in captured_output
+    assert "not found during discovery" not in captured_output
+    assert result == line_checker.EXIT_IO_ERROR
+
+    result = line_checker.main([os.path.join(git_repo, "missing.py"),
+                                "--no_color", "--rev", "HEAD"])
+    assert "Error file not found during discovery" in \
+        capsys.readouterr().out
+    assert result == line_checker.EXIT_IO_ERROR
+
+    outside = os.path.dirname(git_repo)
+    result = line_checker.main([outside, "--no_color", "--rev", "HEAD"])
+    assert "Error reading revision HEAD: " in capsys.readouterr().out
+    assert result == line_checker.EXIT_IO_ERROR
+
+
+def test_git_blob_reader_cache(git_repo):
+    shas = line_checker.git_discovery(git_repo, "HEAD", ["python"])
+    with line_checker.GitBlobReader(git_repo) as reader:
+        assert reader.read(shas[f"HEAD:{git_repo}/foo.py"]) == \
+            LONG_LINE.encode()
+        results = list(line_checker.check_git_blobs(sorted(shas), shas,
+                                                    reader, 80))
+        assert reader.cache_hits == 1
+    assert results == [(f"HEAD:{git_repo}/bar.py", [], None),
+                       (f"HEAD:{git_repo}/copy.py", [(0, 92)], None),
+                       (f"HEAD:{git_repo}/foo.py", [(0, 92)], None)]
+
+
+def test_main_rev(git_repo, capsys):
+    result = line_checker.main([git_repo, "--no_color"])
+    assert result == line_checker.EXIT_OK
+    capsys.readouterr()
+
+    result = line_checker.main([os.path.join(git_repo, "foo.py"),
+                                "--no_color", "--rev", "HEAD"])
+    captured_output = capsys.readouterr().out
+    assert captured_output == ("Line Checker\n1 files checked: Failed\n"
+                               f"HEAD:{git_repo}/foo.py\n"
+                               "  line: 1  -  length: 92\n")
+    assert result == line_checker.EXIT_VIOLATIONS
+
+
+def test_main_rev_with_fix(git_repo, capsys):
+    result = line_checker.main([git_repo, "--rev", "HEAD", "--fix"])
+    assert result == line_checker.EXIT_USAGE
+
+
+def test_main_rev_index(git_repo, capsys):
+    argv = [git_repo, "--no_color", "--rev", "HEAD", "--index", "index.db"]
+    assert line_checker.main(argv) == line_checker.EXIT_VIOLATIONS
+    first = capsys.readouterr().out
+    with mock.patch.object(line_checker.GitBlobReader, "read") as read:
+        assert line_checker.main(argv) == line_checker.EXIT_VIOLATIONS
+    read.assert_not_called()
+    assert capsys.readouterr().out == first
+    # saved fail lines are per line length
+    assert line_checker.main(argv + ["-l", "100"]) == line_checker.EXIT_OK
+
+
+def test_main_rev_metrics(git_repo, capsys):
+    result = line_checker.main([git_repo, "-q", "--rev", "HEAD",
+                                "--metrics-out", "metrics.prom",
+                                "--summary-json"])
+    assert result == line_checker.EXIT_VIOLATIONS
+    with open("metrics.prom") as f:
+        lines = f.read().splitlines()
+    # copy.py has the same blob as foo.py and is not read again
+    num_bytes = len(LONG_LINE) * 2 + len("print('ok')\n")
+    assert f"line_checker_bytes {num_bytes}" in lines
+    assert "line_checker_lines 2" in lines
+    assert f'"bytes":{num_bytes},' in capsys.readouterr().err
@@ -0,0 +1,149 @@
+import os
+import time
+import zipfile
+from unittest import mock
+
+from line_checker import line_checker
+
+LONG_LINE = "# " + "x" * 90 + "\n"
+SETTINGS = {"line_length": 79}
+
+
+def age(*paths):
+    # entries changed in the last seconds are not saved in the index
+    old = time.time() - 60
+    for path in paths:
+        os.utime(path, (old, old))
+
+
+def make_tree(td):
+    td.add_directories_root(["src"])
+    td.add_file("src/a.py", LONG_LINE)
+    td.add_file("src/b.py", "x = 1\n")
+    td.add_file("src/notes.txt", LONG_LINE)
+    age("src/a.py", "src/b.py", "src/notes.txt", "src")
+
+
+def test_index_discovery_skips_unchanged_directories(make_temp_directory):
+    td = make_temp_directory()
+    make_tree(td)
+    index = line_checker.ScanIndex.load("index.db", SETTINGS)
+    found = line_checker.index_discovery("src", ["python"], index)
+    assert sorted(found) == ["src/a.py", "src/b.py"]
+    index.save()
+
+    index = line_checker.ScanIndex.load("index.db", SETTINGS)
+    with mock.patch.object(line_checker.os, "scandir") as scandir:
+        found = line_checker.index_discovery("src", ["python"], index)
+    assert sorted(found) == ["src/a.py", "src/b.py"]
+    scandir.assert_not_called()
+
+    td.add_file("src/c.py", "")
+    found = line_checker.index_discovery("src", ["python"], index)
+    assert sorted(found) == ["src/a.py", "src/b.py", "src/c.py"]
+
+
+def test_index_lookup(make_temp_directory):
+    td = make_temp_directory()
+    make_tree(td)
+    files = ["src/a.py", "src/b.py"]
+    index = line_checker.ScanIndex.load("index.db", SETTINGS)
+    saved, to_check = index.lookup(files)
+    assert saved == [] and to_check == files
+    results = list(index.record(line_checker.check_files(to_check, 79)))
+    index.save()
+
+    index = line_checker.ScanIndex.load("index.db", SETTINGS)
+    saved, to_check = index.lookup(files)
+    assert saved == results and to_check == []
+
+    td.add_file("src/a.py", "x = 2\n")
+    age("src/a.py")
+    saved, to_check = index.lookup(files)
+    assert saved == [("src/b.py", [], None)] and to_check == ["src/a.py"]
+
+
+def test_index_settings_changed(make_temp_directory):
+    td = make_temp_directory()
+    make_tree(td)
+    index = line_checker.ScanIndex.load("index.db", SETTINGS)
+    list(index.record(line_checker.check_files(
+        index.lookup(["src/a.py"])[1], 79)))
+    index.save()
+    index = line_checker.ScanIndex.load("index.db", {"line_length": 100})
+    assert index.lookup(["src/a.py"]) == ([], ["src/a.py"])
+
+
+def test_index_bad_file(make_temp_directory):
+    td = make_temp_directory()
+    td.add_file("index.db", "not an index")
+    try:
+        line_checker.ScanIndex.load("index.db", SETTINGS)
+    except line_checker.LineCheckerError:
+        pass
+    else:
+        assert False, "expected LineCheckerError"
+
+
+def test_main_index(make_temp_directory, capsys):
+    td = make_temp_directory()
+    make_tree(td)
+    argv = ["src", "--no_color", "--index", "index.db"]
+    assert line_checker.main(argv) == line_checker.EXIT_VIOLATIONS
+    first = capsys.readouterr().out
+    with mock.patch.object(line_checker, "load_file") as load_file:
+        assert line_checker.main(argv) == line_checker.EXIT_VIOLATIONS
+    load_file.assert_not_called()
+    assert capsys.readouterr().out == first
+    assert "src/a.py" in first and "length: 92" in first
+
+
+def test_main_index_archive(make_temp_directory, capsys):
+    make_temp_directory()
+    zipfile.ZipFile("foo.zip", "w").close()
+    argv = ["foo.zip", "--index", "index.db"]
+    assert line_checker.main(argv) == line_checker.EXIT_USAGE
+
+
+def test_main_index_recursive(make_temp_directory, capsys):
+    td = make_temp_directory()
+    make_tree(td)
+    td.add_directories_root(["src/pkg"])
+    td.add_file("src/pkg/c.py", LONG_LINE)
+    age("src/pkg/c.py", "src/pkg", "src")
+    argv = ["src", "--no_color", "--index", "index.db",
+            "--discovery_threads", "2"]
+    for _ in range(2):
+        assert line_checker.main(argv) == line_checker.EXIT_VIOLATIONS
+        out = capsys.readouterr().out
+        assert "3 files checked: 1 Passed, 2 Failed" in out
+        assert "src/pkg/c.py" in out
+
+
+def test_main_index_reclassifies_files(make_temp_directory, capsys):
+    td = make_temp_directory()
+    td.add_directories_root(["t"])
+    td.add_file("t/script", "#!/usr/bin/env python\n" + LONG_LINE)
+    os.chmod("t/script", 0o644)
+    age("t/script", "t")
+    argv = ["t", "--no_color", "--index", "index.db"]
+    assert line_checker.main(argv) == line_checker.EXIT_OK
+    # chmod does not change the mtime of the directory
+    os.chmod("t/script", 0o755)
+    assert line_checker.main(argv) == line_checker.EXIT_VIOLATIONS
+    assert "t/script" in capsys.readouterr().out
+    assert line_checker.main(argv[:2]) == line_checker.EXIT_VIOLATIONS
+
+
+def test_index_old_version(make_temp_directory):
+    td = make_temp_directory()
+    make_tree(td)
+    index = line_checker.ScanIndex.load("index.db", SETTINGS)
+    line_checker.index_discovery("src", ["python"], index)
+    index.save()
+    connection = line_checker.sqlite3.connect("index.db")
+    connection.execute("PRAGMA user_version = 1")
+    connection.commit()
+    connection.close()
+    index = line_checker.ScanIndex.load("index.db", SETTINGS)
+    assert index.clear and index.dirs == {}
@@ -0,0 +1,108 @@
+import tracemalloc
+
+import pytest
+
+from line_checker import line_checker
+
+LONG_LINE = "# " + "x" * 90 + "\n"
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("100", 100), ("2K", 2048), ("1.5M", 1572864), ("1g", 1024 ** 3),
+])
+def test_parse_size(value, expected):
+    assert line_checker.parse_size(value) == expected
+
+
+@pytest.mark.parametrize("value", ["0", "M", "abc", "-5K"])
+def test_parse_size_invalid(value):
+    with pytest.raises(SystemExit):
+        line_checker.argument_parsing(["foo.py", "--max_file_size", value])
+
+
+def make_files(td):
+    td.add_file("small.py", LONG_LINE)
+    td.add_file("big.py", "x = 1\n" * 50 + LONG_LINE)
+    td.add_file("ok.py", "x = 1\n")
+    return ["small.py", "big.py", "ok.py"]
+
+
+@pytest.mark.parametrize("large_files, expected, streamed, skipped", [
+    ("stream", [("small.py", [(0, 92)], None), ("big.py", [(50, 92)], None),
+                ("ok.py", [], None)], ["big.py"], []),
+    ("skip", [("small.py", [(0, 92)], None), ("ok.py", [], None)],
+     [], ["big.py"]),
+])
+def test_check_files_limited(make_temp_directory, large_files, expected,
+                             streamed, skipped):
+    files = make_files(make_temp_directory())
+    limits = line_checker.ResourceLimits(max_file_size=200,
+                                         large_files=large_files)
+    result = list(line_checker.check_files_limited(files, 80, limits))
+    assert result == expected
+    assert limits.streamed == streamed
+    assert limits.skipped == skipped
+
+
+def test_check_files_limited_memory_budget(make_temp_directory):
+    td = make_temp_directory()
+    files = []
+    for i in range(20):
+        td.add_file(f"f{i}.py", LONG_LINE * 3)
+        files.append(f"f{i}.py")
+    td.add_file("bad.py", "")
+    with open("bad.py", "wb") as f:
+        f.write(b"\xff\xfe\n")
+    limits = line_checker.ResourceLimits(max_memory=300, queue_size=2)
+    result = list(line_checker.check_files_limited(files + ["bad.py",
+                                                            "missing.py"],
+                                                   80, limits))
+    assert [r[1] for r in result[:20]] == [[(0, 92), (1, 92), (2, 92)]] * 20
+    assert result[20][2] is not None
+    assert result[21][2] is not None
+
+
+def test_main_max_file_size_skip(make_temp_directory, capsys):
+    td = make_temp_directory()
+    make_files(td)
+    test_dir = td.get_temp_directory()
+    result = line_checker.main([test_dir, "--no_color", "--max-file-size",
+                                "200", "--large_files", "skip"])
+    captured_output = capsys.readouterr().out
+    assert f"Skipped {test_dir}/big.py: bigger than 200 bytes\n" in \
+        captured_output
+    assert "2 files checked: 1 Passed, 1 Failed\n" in captured_output
+    assert result == line_checker.EXIT_VIOLATIONS
+
+
+@pytest.mark.parametrize("options", [[], ["-j2"]])
+def test_main_max_memory_stream(make_temp_directory, capsys, options):
+    td = make_temp_directory()
+    make_files(td)
+    test_dir = td.get_temp_directory()
+    result = line_checker.main([test_dir, "--no_color", "--max-memory",
+                                "200"] + options)
+    captured_output = capsys.readouterr().out
+    assert "3 files checked: 1 Passed, 2 Failed\n" in captured_output
+    assert "  line: 51  -  length: 92\n" in captured_output
+    assert result == line_checker.EXIT_VIOLATIONS
+
+
+def test_check_files_limited_memory(make_test_file):
+    tf = make_test_file("foo.py", "x = 1\n" * 100000)
+    limits = line_checker.ResourceLimits(max_memory=2 * 1024 * 1024)
+    tracemalloc.start()
+    try:
+        results = list(line_checker.check_files_limited([tf], 79, limits))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert results == [(tf, [], None)]
+    # the bytes and text of the file, not a list of its lines
+    assert peak < 2 * 1024 * 1024
+
+
+def test_iter_lines():
+    text = "a\r\nb\rc\x0cd\n\ne"
+    assert list(line_checker.iter_lines(text)) == text.splitlines()
+    assert list(line_checker.iter_lines("a\n")) == ["a"]
@@ -1,3 +1,4 @@
+import json
 from unittest import mock
 
 import pytest
@@ -157,7 +158,7 @@ def test_main_file_not_found(tmpdir, capsys):
     result = line_checker.main([td.strpath])
     captured_output = capsys.readouterr().out
     assert captured_output == expected_cap
-    assert result == 1
+    assert result == line_checker.EXIT_IO_ERROR
 
 
 def test_main_not_python_file(capsys, make_test_file):
@@ -235,7 +236,7 @@ def test_main_one_file_failed(capsys, make_test_file):
     result = line_checker.main([tf])
     captured_output = capsys.readouterr().out
     assert captured_output == expected_capture
-    assert result == 0
+    assert result == line_checker.EXIT_VIOLATIONS
 
 
 def test_main_multiple_files_no_check(capsys, make_temp_directory):
@@ -319,7 +320,7 @@ def test_main_multiple_files_one_fail(capsys, make_temp_directory):
     result = line_checker.main([test_dir])
     captured_output = capsys.readouterr().out
     assert captured_output == expected_capture
-    assert result == 0
+    assert result == line_checker.EXIT_VIOLATIONS
 
 
 @pytest.mark.parametrize("length, details", (
@@ -368,7 +369,7 @@ def test_main_line_length(make_test_file, capsys, length, details):
     result = line_checker.main([tf] + length)
     captured_output = capsys.readouterr().out
     assert captured_output == expected_capture
-    assert result == 0
+    assert result == line_checker.EXIT_VIOLATIONS
 
 
 def test_main_line_length_pass(make_test_file, capsys):
@@ -427,7 +428,7 @@ def test_main_file_failed_quiet_mode(make_test_file, capsys):
     result = line_checker.main([tf, "-q"])
     captured_output = capsys.readouterr().out
     assert captured_output == expected_capture
-    assert result == 0
+    assert result == line_checker.EXIT_VIOLATIONS
 
 
 def test_save_results_to_file_passed(make_test_file):
@@ -466,7 +467,7 @@ def test_save_results_to_file_fail(make_test_file):
         with open(f"line_checker_out{test_date_time}", "r") as f:
             data = f.read()
         assert data == expected
-        assert result == 0
+        assert result == line_checker.EXIT_VIOLATIONS
 
 
 def test_main_file_passed_quiet_mode_save_to_file(make_test_file, capsys):
@@ -507,7 +508,7 @@ def test_main_file_failed_quiet_mode_save_to_file(make_test_file, capsys):
         result = line_checker.main([tf, "-q", "-S"])
         captured_output = capsys.readouterr().out
         assert captured_output == expected_capture
-        assert result == 0
+        assert result == line_checker.EXIT_VIOLATIONS
         expected = "line checker\n1 file checked: failed\n"
         expected += f"{tf}\n  line 1 - length: 108\n"
         with open(f"line_checker_out{test_date_time}", "r") as f:
@@ -527,3 +528,97 @@ def test_main_file_save_to_file_out_file(make_test_file):
         data = f.read()
     assert data == "line checker\n1 file checked: passed\n"
     assert result == 0
+
+
+def test_main_summary_json(make_test_file, capsys):
+    tf = make_test_file("foo.py", "# " + "x" * 90 + "\nprint('hi')\n")
+    result = line_checker.main([tf, "--summary-json", "-q"])
+    summary = json.loads(capsys.readouterr().err)
+    assert summary["files_checked"] == 1
+    assert summary["files_failed"] == 1
+    assert summary["violations"] == 1
+    assert summary["io_errors"] == 0
+    assert summary["bytes"] == 105
+    assert summary["exit_code"] == result == line_checker.EXIT_VIOLATIONS
+
+
+@pytest.mark.parametrize("options", [[], ["-j2"]])
+def test_main_read_error(make_test_file, capsys, options):
+    tf = make_test_file("foo.py", "")
+    with open(tf, "wb") as f:
+        f.write(b"# \xff\xfe not text\n")
+    result = line_checker.main([tf, "--no_color"] + options)
+    captured_output = capsys.readouterr().out
+    assert f"Error reading {tf}" in captured_output
+    assert result == line_checker.EXIT_IO_ERROR
+
+
+def test_fail_results():
+    fails = line_checker.FailResults()
+    fails.add("foo.py", [(0, 92), (4, 81)])
+    fails.add("".join(["bar", ".py"]), [(10, 100)])
+    assert len(fails) == 2
+    assert fails.num_violations() == 3
+    assert [(f, list(lines)) for f, lines in fails] == [
+        ("foo.py", [(0, 92), (4, 81)]),
+        ("bar.py", [(10, 100)]),
+    ]
+    assert fails.files[1] is line_checker.sys.intern("bar.py")
+
+
+def test_save_results_to_file_fail_results(tmpdir):
+    fails = line_checker.FailResults()
+    fails.add("foo.py", [(0, 92), (4, 81)])
+    out_file = tmpdir.join("out").strpath
+    line_checker.save_results_to_file(["foo.py", "bar.py"], fails, out_file)
+    with open(out_file) as f:
+        data = f.read()
+    assert data == ("line checker\n2 file checked: failed\nfoo.py\n"
+                    "  line 1 - length: 92\n  line 5 - length: 81\n")
+
+
+@pytest.mark.parametrize("length, expected", [
+    (85, ""), (90, "warn"), (125, "error"),
+])
+def test_severity(length, expected):
+    thresholds = [(88, "warn"), (120, "error")]
+    assert line_checker.severity(length, thresholds) == expected
+
+
+@pytest.mark.parametrize("lengths, details, expected_result", [
+    (["-l88:warn", "-l120:error"],
+     "1 files checked: Passed\n2 warn, 0 error\n{tf}\n"
+     "  line: 1  -  length: 92  (warn)\n"
+     "  line: 2  -  length: 100  (warn)\n",
+     line_checker.EXIT_OK),
+    (["-l88:warn", "-l95:error"],
+     "1 files checked: Failed\n1 warn, 1 error\n{tf}\n"
+     "  line: 1  -  length: 92  (warn)\n"
+     "  line: 2  -  length: 100  (error)\n",
+     line_checker.EXIT_VIOLATIONS),
+])
+def test_main_warn_and_error_thresholds(make_test_file, capsys, lengths,
+                                        details, expected_result):
+    tf = make_test_file("foo.py", "# " + "x" * 90 + "\n" + "x" * 100 + "\n")
+    result = line_checker.main([tf, "--no_color"] + lengths)
+    captured_output = capsys.readouterr().out
+    assert captured_output == "Line Checker\n" + details.format(tf=tf)
+    assert result == expected_result
+
+
+@pytest.mark.parametrize("options", [[], ["-j2"]])
+def test_main_discovery_threads(tmpdir, capsys, options):
+    for name in ["z.py", "a.py", "sub/m.py", "sub/ok.py"]:
+        tmpdir.join(name).ensure().write("# " + "x" * 90 + "\n")
+    tmpdir.join("sub/ok.py").write("\n")
+    path = tmpdir.strpath
+    result = line_checker.main([path, "--discovery_threads", "3",
+                                "--no_color"] + options)
+    captured_output = capsys.readouterr().out
+    assert captured_output == (
+        "Line Checker\n4 files checked: 1 Passed, 3 Failed\n"
+        f"{path}/a.py\n  line: 1  -  length: 92\n"
+        f"{path}/sub/m.py\n  line: 1  -  length: 92\n"
+        f"{path}/z.py\n  line: 1  -  length: 92\n"
+    )
+    assert result == line_checker.EXIT_VIOLATIONS
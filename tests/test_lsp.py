@@ -0,0 +1,152 @@
+import io
+import json
+import random
+
+import pytest
+
+from line_checker import line_checker
+
+LONG = "x" * 90
+
+
+def lsp_message(message):
+    body = json.dumps(message).encode()
+    return f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+
+
+def read_messages(data):
+    messages = []
+    stream = io.BytesIO(data)
+    server = line_checker.LanguageServer(stream, io.BytesIO(),
+                                         [(80, "error")])
+    while True:
+        message = server.read_message()
+        if message is None:
+            return messages
+        messages.append(message)
+
+
+def change(start, end, text):
+    return {"range": {"start": {"line": start[0], "character": start[1]},
+                      "end": {"line": end[0], "character": end[1]}},
+            "text": text}
+
+
+def test_text_document_incremental_changes():
+    document = line_checker.TextDocument(f"a\n{LONG}\nb\n{LONG}", 80)
+    assert document.long_lines == [1, 3]
+    document.apply_change(change((0, 0), (0, 0), "new\nlines\n"))
+    assert document.long_lines == [3, 5]
+    document.apply_change(change((3, 0), (3, 50), ""))
+    assert document.long_lines == [5]
+    document.apply_change(change((1, 0), (4, 1), LONG))
+    assert document.lines == ["new", LONG, LONG]
+    assert document.long_lines == [1, 2]
+    document.apply_change({"text": "short"})
+    assert document.long_lines == []
+
+
+def test_text_document_random_edits_match_checker():
+    rng = random.Random(4)
+    document = line_checker.TextDocument("", 20)
+    for _ in range(300):
+        line = rng.randrange(len(document.lines))
+        end_line = min(line + rng.randrange(3), len(document.lines) - 1)
+        text = rng.choice(["", "\n", "y" * 15, "z" * 30 + "\n" + "w" * 5])
+        document.apply_change(change(
+            (line, rng.randrange(25)), (end_line, rng.randrange(25)), text))
+        expected = [i for i, _ in line_checker.checker(document.lines, 20)]
+        assert document.long_lines == expected
+
+
+@pytest.mark.parametrize("line, character, expected", [
+    ("abc", 2, 2), ("abc", 10, 3), ("a\U0001F600b", 3, 2),
+    ("a\U0001F600b", 1, 1),
+])
+def test_utf16_to_index(line, character, expected):
+    assert line_checker.utf16_to_index(line, character) == expected
+
+
+def test_language_server_session():
+    uri = "file:///foo.py"
+    requests = b"".join(lsp_message(m) for m in [
+        {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {}},
+        {"jsonrpc": "2.0", "method": "initialized", "params": {}},
+        {"jsonrpc": "2.0", "method": "textDocument/didOpen",
+         "params": {"textDocument": {"uri": uri, "text": f"{LONG}\nok\n"}}},
+        {"jsonrpc": "2.0", "method": "textDocument/didChange",
+         "params": {"textDocument": {"uri": uri},
+                    "contentChanges": [change((1, 0), (1, 2), "y" * 130)]}},
+        {"jsonrpc": "2.0", "id": 2, "method": "foo/bar"},
+        {"jsonrpc": "2.0", "id": 3, "method": "shutdown"},
+        {"jsonrpc": "2.0", "method": "exit"},
+    ])
+    out = io.BytesIO()
+    server = line_checker.LanguageServer(io.BytesIO(requests), out,
+                                         [(80, "warn"), (120, "error")],
+                                         debounce=0)
+    assert server.serve() == line_checker.EXIT_OK
+
+    responses = read_messages(out.getvalue())
+    assert responses[0]["id"] == 1
+    assert responses[0]["result"]["capabilities"]["textDocumentSync"][
+        "change"] == 2
+    opened = responses[1]["params"]["diagnostics"]
+    assert [(d["range"]["start"]["line"], d["severity"]) for d in opened] == \
+        [(0, 2)]
+    assert opened[0]["range"]["start"]["character"] == 80
+    changed = responses[2]["params"]["diagnostics"]
+    assert [(d["range"]["start"]["line"], d["severity"]) for d in changed] == \
+        [(0, 2), (1, 1)]
+    assert responses[3]["error"]["code"] == -32601
+    assert responses[4] == {"id": 3, "result": None, "jsonrpc": "2.0"}
+
+
+def test_language_server_debounce():
+    uri = "file:///foo.py"
+    out = io.BytesIO()
+    server = line_checker.LanguageServer(io.BytesIO(), out, [(80, "error")],
+                                         debounce=10)
+    server.handle({"method": "textDocument/didOpen",
+                   "params": {"textDocument": {"uri": uri, "text": LONG}}})
+    for _ in range(5):
+        server.handle({"method": "textDocument/didChange",
+                       "params": {"textDocument": {"uri": uri},
+                                  "contentChanges": [{"text": LONG}]}})
+    assert out.getvalue() == b""
+    assert len(server.timers) == 1
+    server.timers[uri].cancel()
+    server.publish(uri)
+    assert len(read_messages(out.getvalue())) == 1
+
+
+def test_language_server_survives_bad_messages():
+    uri = "file:///foo.py"
+    requests = b"".join([
+        lsp_message({"jsonrpc": "2.0", "method": "textDocument/didChange",
+                     "params": {"textDocument": {"uri": uri},
+                                "contentChanges": [{"text": LONG}]}}),
+        lsp_message({"jsonrpc": "2.0", "id": 1,
+                     "method": "textDocument/didOpen", "params": {}}),
+        b"Content-Length: 5\r\n\r\n{bad}",
+        b"Content-Length: abc\r\n\r\n",
+        lsp_message([1, 2]),
+        lsp_message({"jsonrpc": "2.0", "method": "textDocument/didOpen",
+                     "params": {"textDocument": {"uri": uri,
+                                                 "text": LONG}}}),
+        lsp_message({"jsonrpc": "2.0", "id": 2, "method": "shutdown"}),
+        lsp_message({"jsonrpc": "2.0", "method": "exit"}),
+    ])
+    out = io.BytesIO()
+    server = line_checker.LanguageServer(io.BytesIO(requests), out,
+                                         [(80, "error")], debounce=0)
+    assert server.serve() == line_checker.EXIT_OK
+
+    responses = read_messages(out.getvalue())
+    assert responses[0]["id"] == 1
+    assert responses[0]["error"]["code"] == -32602
+    assert [r["error"]["code"] for r in responses[1:4]] == \
+        [-32700, -32700, -32600]
+    assert responses[4]["params"]["uri"] == uri
+    assert len(responses[4]["params"]["diagnostics"]) == 1
+    assert responses[5] == {"id": 2, "result": None, "jsonrpc": "2.0"}
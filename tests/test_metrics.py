@@ -0,0 +1,59 @@
+import pytest
+
+from line_checker import line_checker
+
+LONG_LINE = "# " + "x" * 90 + "\n"
+
+
+def test_metrics_render():
+    metrics = line_checker.Metrics()
+    metrics.stages = {"check": 2.0, "discovery": 0.5}
+    metrics.files = 4
+    metrics.bytes = 1000
+    metrics.lines = 50
+    metrics.cache_hits = 1
+    metrics.workers = 2
+    metrics.busy_time = 3.0
+    fails = line_checker.FailResults()
+    fails.add("a.py", [(0, 92), (3, 81)])
+    fails.add("b.pyi", [(1, 85)])
+    fails.add("c.py", [(1, 85)])
+    metrics.add_violations(fails)
+    lines = metrics.render().splitlines()
+    assert lines[-1] == "# EOF"
+    assert 'line_checker_stage_duration_seconds{stage="check"} 2.0' in lines
+    assert "line_checker_files 4" in lines
+    assert "line_checker_bytes 1000" in lines
+    assert "line_checker_lines 50" in lines
+    assert "line_checker_cache_hit_ratio 0.25" in lines
+    assert "line_checker_worker_utilization_ratio 0.75" in lines
+    assert 'line_checker_violations{file_type=".py"} 3' in lines
+    assert 'line_checker_violations{file_type=".pyi"} 1' in lines
+    assert "# TYPE line_checker_files gauge" in lines
+
+
+# with -j files are read in chunks by the workers, so identical files
+# are not skipped
+@pytest.mark.parametrize("options, num_lines, hit_ratio", [
+    ([], 3, "0.333333"), (["-j2"], 5, "0.0"),
+])
+def test_main_metrics_out(make_temp_directory, options, num_lines,
+                          hit_ratio):
+    td = make_temp_directory()
+    td.add_file("a.py", LONG_LINE + "x = 1\n")
+    td.add_file("b.py", LONG_LINE + "x = 1\n")
+    td.add_file("c.py", "x = 1\n")
+    test_dir = td.get_temp_directory()
+    result = line_checker.main([test_dir, "-q", "--metrics-out",
+                                "metrics.prom"] + options)
+    assert result == line_checker.EXIT_VIOLATIONS
+    with open("metrics.prom") as f:
+        lines = f.read().splitlines()
+    assert "line_checker_files 3" in lines
+    assert "line_checker_bytes 204" in lines
+    assert f"line_checker_lines {num_lines}" in lines
+    assert f"line_checker_cache_hit_ratio {hit_ratio}" in lines
+    assert 'line_checker_violations{file_type=".py"} 2' in lines
+    for stage in ["check", "discovery", "report"]:
+        assert any(line.startswith("line_checker_stage_duration_seconds"
+                                   f'{{stage="{stage}"}}') for line in lines)
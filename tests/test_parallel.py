@@ -0,0 +1,50 @@
+import pytest
+
+from line_checker import line_checker
+
+FILE_DATA = "".join(
+    "# " + "x" * (i * 7 % 120) + "\n" if i % 3 else "\r\n"
+    for i in range(200)
+)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1000, 100000])
+def test_check_chunk_stitched_matches_checker(make_test_file, chunk_size):
+    tf = make_test_file("foo.py", FILE_DATA)
+    expected = line_checker.checker(line_checker.load_file(tf), 80)
+    result = list(line_checker.parallel_checker([tf], 80, 2, chunk_size))
+    assert result == [(tf, expected, None)]
+
+
+def test_schedule_largest_first():
+    sizes = {"small.py": 10, "big.py": 250, "empty.py": 0}
+    result = line_checker.schedule(list(sizes), sizes, 100)
+    assert result[:2] == [("big.py", 0, 100), ("big.py", 100, 200)]
+    assert result[-1] == ("empty.py", 0, 0)
+    assert len(result) == 5
+
+
+def test_parallel_checker_keeps_file_order(make_temp_directory):
+    td = make_temp_directory()
+    td.add_file("a.py", "\n")
+    td.add_file("b.py", FILE_DATA * 5)
+    td.add_file("c.py", "# " + "x" * 90 + "\n")
+    result = list(line_checker.parallel_checker(["a.py", "b.py", "c.py"],
+                                                80, 3, 512))
+    assert [file for file, _, _ in result] == ["a.py", "b.py", "c.py"]
+    assert result[0][1] == []
+    assert result[2][1] == [(0, 92)]
+
+
+def test_main_jobs(make_test_file, capsys):
+    tf = make_test_file("foo.py", "# " + "x" * 90 + "\nprint('hi')\n")
+    line_checker.main([tf, "-j", "2", "--chunk_size", "4", "--no_color"])
+    captured_output = capsys.readouterr().out
+    assert captured_output == ("Line Checker\n1 files checked: Failed\n"
+                               f"{tf}\n  line: 1  -  length: 92\n")
+
+
+@pytest.mark.parametrize("option", ["-j0", "--chunk_size=0", "-jx"])
+def test_argument_parsing_jobs_invalid(option):
+    with pytest.raises(SystemExit):
+        line_checker.argument_parsing(["foo.py", option])
@@ -0,0 +1,121 @@
+""" Performance tests, run with pytest -m perf.
+
+Ratios are generous so the tests only catch a change in how the checker
+scales, not the speed of the machine running them.
+"""
+import os
+import time
+import tracemalloc
+
+import pytest
+
+from line_checker import line_checker
+
+pytestmark = pytest.mark.perf
+
+LINE = "x = 1  # " + "y" * 60 + "\n"
+
+
+def cpu_count():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def make_tree(temp_directory, name, file_count, lines=200):
+    temp_directory.add_directories_root([name])
+    for number in range(file_count):
+        temp_directory.add_file(os.path.join(name, f"file{number}.py"),
+                                LINE * lines)
+    return [os.path.join(name, f"file{number}.py")
+            for number in range(file_count)]
+
+
+def best_time(func, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def test_time_linear_in_file_count(make_temp_directory):
+    temp_directory = make_temp_directory()
+    small = make_tree(temp_directory, "small", 250)
+    large = make_tree(temp_directory, "large", 1000)
+
+    small_time = best_time(lambda: list(line_checker.check_files(small, 79)))
+    large_time = best_time(lambda: list(line_checker.check_files(large, 79)))
+    # four times the files should take about four times as long
+    assert large_time < small_time * 4 * 2.5
+
+
+def test_main_time_linear_in_file_count(make_temp_directory, capsys):
+    temp_directory = make_temp_directory()
+    make_tree(temp_directory, "small", 250)
+    make_tree(temp_directory, "large", 1000)
+
+    small_time = best_time(lambda: line_checker.main(["small", "-q"]))
+    large_time = best_time(lambda: line_checker.main(["large", "-q"]))
+    capsys.readouterr()
+    assert large_time < small_time * 4 * 2.5
+
+
+@pytest.mark.parametrize("mode", ["stream", "chunks"])
+def test_memory_flat_for_large_files(make_temp_directory, mode):
+    temp_directory = make_temp_directory()
+    temp_directory.add_file("small.py", LINE * 20000)
+    temp_directory.add_file("large.py", LINE * 160000)
+    limits = line_checker.ResourceLimits(max_file_size=64 * 1024)
+
+    def peak(file):
+        tracemalloc.start()
+        try:
+            if mode == "stream":
+                list(line_checker.check_files_limited([file], 79, limits))
+            else:
+                size = os.path.getsize(file)
+                for start in range(0, size, 64 * 1024):
+                    line_checker.check_chunk(file, start,
+                                             min(start + 64 * 1024, size), 79)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    small_peak = peak("small.py")
+    large_peak = peak("large.py")
+    # the large file is 8 times bigger, memory should not follow it
+    assert os.path.getsize("large.py") > 10 * 1024 * 1024
+    assert large_peak < small_peak * 2 + 256 * 1024
+    assert large_peak < 2 * 1024 * 1024
+
+
+@pytest.mark.skipif(cpu_count() < 2, reason="needs more than one cpu")
+def test_parallel_speedup(make_temp_directory):
+    temp_directory = make_temp_directory()
+    files = make_tree(temp_directory, "tree", 400, lines=5000)
+
+    serial_time = best_time(lambda: list(line_checker.check_files(files, 79)),
+                            repeat=2)
+    parallel_time = best_time(
+        lambda: line_checker.parallel_checker(files, 79, jobs=cpu_count()),
+        repeat=2)
+    assert parallel_time < serial_time / 1.3
+
+
+def test_index_no_op_run(make_temp_directory, capsys):
+    temp_directory = make_temp_directory()
+    make_tree(temp_directory, "tree", 2000, lines=50)
+    old = time.time() - 60
+    for root, _, files in os.walk("tree"):
+        for name in files + [""]:
+            os.utime(os.path.join(root, name), (old, old))
+    argv = ["tree", "-q", "--index", "index.db"]
+
+    start = time.perf_counter()
+    line_checker.main(argv)
+    first_time = time.perf_counter() - start
+    no_op_time = best_time(lambda: line_checker.main(argv))
+    capsys.readouterr()
+    assert no_op_time < first_time / 2
@@ -0,0 +1,76 @@
+import io
+from unittest import mock
+
+from line_checker import line_checker
+
+
+def test_progress_status():
+    progress = line_checker.Progress(io.StringIO(), is_tty=False)
+    progress.files_found = 10
+    with mock.patch.object(line_checker.time, "time", return_value=100.0):
+        progress.start_time = 98.0
+        progress.file_done(1024 * 1024)
+        progress.file_done(1024 * 1024)
+        assert progress.status() == \
+            "2/10 files  1.0 files/s  1.00 MB/s  eta 8s"
+
+
+def test_progress_plain_lines():
+    stream = io.StringIO()
+    progress = line_checker.Progress(stream, is_tty=False)
+    assert progress.interval == line_checker.PROGRESS_LOG_INTERVAL
+    progress.start()
+    progress.files_found = 1
+    progress.file_done(10)
+    progress.stop()
+    assert stream.getvalue().startswith("1/1 files  ")
+    assert stream.getvalue().endswith("\n")
+    assert "\r" not in stream.getvalue()
+
+
+def test_progress_tty_redraws():
+    stream = io.StringIO()
+    with mock.patch.object(line_checker, "PROGRESS_INTERVAL", 0.001):
+        progress = line_checker.Progress(stream, is_tty=True)
+    progress.start()
+    progress.files_found = 1
+    progress.file_done(10)
+    progress.stop()
+    lines = stream.getvalue().split("\r\033[K")
+    assert len(lines) >= 2
+    assert lines[-1].startswith("1/1 files  ")
+    assert stream.getvalue().endswith("\n")
+
+
+def test_main_progress(make_test_file, capsys):
+    tf = make_test_file("foo.py", "print('hi')\n")
+    result = line_checker.main([tf, "--progress", "--no_color"])
+    captured = capsys.readouterr()
+    assert captured.out == "Line Checker\n1 files checked: Passed\n"
+    assert captured.err.startswith("1/1 files  ")
+    assert result == line_checker.EXIT_OK
+
+
+def test_main_progress_jobs(make_test_file, capsys):
+    # the pool starts while progress is drawn, not before it
+    tf = make_test_file("foo.py", "print('hi')\n" * 100)
+    events = []
+    pool = line_checker.concurrent.futures.ProcessPoolExecutor
+    start = line_checker.Progress.start
+
+    def make_pool(*args, **kwargs):
+        events.append("pool")
+        return pool(*args, **kwargs)
+
+    def start_progress(self):
+        events.append("progress")
+        start(self)
+    with mock.patch.object(line_checker.concurrent.futures,
+                           "ProcessPoolExecutor", make_pool), \
+            mock.patch.object(line_checker.Progress, "start",
+                              start_progress):
+        result = line_checker.main([tf, "--progress", "--no_color", "-j2"])
+    captured = capsys.readouterr()
+    assert events == ["progress", "pool"]
+    assert captured.err.startswith("1/1 files  ")
+    assert result == line_checker.EXIT_OK
@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+from line_checker import line_checker
+
+
+def test_run_rules():
+    text = "a = 1  \n\tb = 2\r\nc = 3"
+    rules = line_checker.RULE_NAMES
+    assert line_checker.run_rules(text, 80, rules) == [
+        (0, 5, "trailing_whitespace"),
+        (1, 0, "tabs"),
+        (1, 6, "crlf"),
+        (2, 5, "final_newline"),
+    ]
+
+
+def test_run_rules_line_length():
+    text = "x" * 10 + "\t\n"
+    assert line_checker.run_rules(text, 5, ("line_length", "tabs")) == [
+        (0, 11),
+        (0, 10, "tabs"),
+    ]
+    assert line_checker.run_rules(text, 5, ("line_length",)) == [(0, 11)]
+
+
+def test_run_rules_clean():
+    text = "a = 1\nb = 2\n"
+    assert line_checker.run_rules(text, 80, line_checker.RULE_NAMES) == []
+    assert line_checker.run_rules("", 80, line_checker.RULE_NAMES) == []
+
+
+def test_parse_rules():
+    assert line_checker.parse_rules("tabs, crlf") == ("tabs", "crlf")
+    with pytest.raises(Exception):
+        line_checker.parse_rules("tabs,spaces")
+
+
+def test_fail_results_rules():
+    fails = line_checker.FailResults()
+    fails.add("foo.py", [(0, 90), (1, 3, "tabs")])
+    fails.add("bar.py", [(2, 85)])
+    assert [(name, list(lines)) for name, lines in fails] == [
+        ("foo.py", [(0, 90), (1, 3, "tabs")]),
+        ("bar.py", [(2, 85)]),
+    ]
+
+
+def test_main_rules(make_temp_directory, capsys):
+    make_temp_directory()
+    with open("foo.py", "w", newline="") as f:
+        f.write("a = 1 \r\nb = 2\n")
+    with open("bar.py", "w") as f:
+        f.write("c = 3\n")
+    assert line_checker.main([".", "--no_color"]) == line_checker.EXIT_OK
+    argv = [".", "--no_color", "--rules", "crlf,trailing_whitespace",
+            "--json_out", "out.json"]
+    assert line_checker.main(argv) == line_checker.EXIT_VIOLATIONS
+    out = capsys.readouterr().out
+    assert "line: 1  -  trailing whitespace" in out
+    assert "line: 1  -  CRLF line ending" in out
+    with open("out.json") as f:
+        data = json.load(f)
+    assert data["fails"][0]["lines"] == [[1, 5, "trailing_whitespace"],
+                                         [1, 6, "crlf"]]
+    _, fails, _ = line_checker.load_results_from_json("out.json")
+    assert list(fails.fail_lines(0)) == [(0, 5, "trailing_whitespace"),
+                                         (0, 6, "crlf")]
+
+
+def test_run_rules_tab_is_trailing_whitespace():
+    rules = ("line_length", "trailing_whitespace", "tabs", "crlf")
+    assert line_checker.run_rules("x = 1\t\n", 80, rules) == [
+        (0, 5, "trailing_whitespace"),
+        (0, 5, "tabs"),
+    ]
+    assert line_checker.run_rules("x\t\r\n", 80, rules) == [
+        (0, 1, "trailing_whitespace"),
+        (0, 1, "tabs"),
+        (0, 2, "crlf"),
+    ]
+
+
+def test_run_rules_line_numbers_match_load_file(make_test_file):
+    text = "import os\n\x0c\nx = 1\t" + "y" * 90 + "\n"
+    test_file = make_test_file("foo.py", text)
+    fail_lines = line_checker.run_rules(text, 80, ("line_length", "tabs"))
+    assert fail_lines == [(3, 96), (3, 5, "tabs")]
+    line_data = line_checker.load_file(test_file)
+    assert line_data[3].startswith("x = 1\t")
+    assert len(line_checker.violation_keys(test_file, fail_lines)) == 2
+
+
+@pytest.mark.parametrize("option", [["-j", "2"], ["--max_memory", "1M"],
+                                    ["--max_file_size", "1K"]])
+def test_main_rules_with_limits(make_temp_directory, option):
+    td = make_temp_directory()
+    td.add_file("foo.py", "x = 1\n")
+    argv = ["foo.py", "--rules", "line_length,tabs"] + option
+    assert line_checker.main(argv) == line_checker.EXIT_USAGE
+
+
+def test_check_rules_metrics_lines(make_test_file):
+    test_file = make_test_file("foo.py", "a = 1\nb = 2")
+    for check in (lambda m: line_checker.check_rules([test_file], 80,
+                                                     ("tabs",), m),
+                  lambda m: line_checker.check_files([test_file], 80, m)):
+        metrics = line_checker.Metrics()
+        list(check(metrics))
+        assert metrics.lines == 2
@@ -0,0 +1,133 @@
+import json
+
+import pytest
+
+from line_checker import line_checker
+
+
+@pytest.mark.parametrize("strategy", line_checker.SHARD_STRATEGIES)
+def test_shard_files_cover_all_files_once(make_temp_directory, strategy):
+    td = make_temp_directory()
+    for i in range(20):
+        td.add_file(f"file{i}.py", "x" * i)
+    files = [f"file{i}.py" for i in range(20)]
+    shards = [line_checker.shard_files(files, i, 3, strategy)
+              for i in range(1, 4)]
+    combined = [f for shard in shards for f in shard]
+    assert sorted(combined) == sorted(files)
+    assert all(shards)
+
+
+def test_shard_files_size_balanced(make_temp_directory):
+    td = make_temp_directory()
+    td.add_file("big.py", "x" * 100)
+    td.add_file("a.py", "x" * 50)
+    td.add_file("b.py", "x" * 50)
+    files = ["a.py", "big.py", "b.py"]
+    assert line_checker.shard_files(files, 1, 2, "size") == ["big.py"]
+    assert line_checker.shard_files(files, 2, 2, "size") == ["a.py", "b.py"]
+
+
+@pytest.mark.parametrize("value", ["0/2", "3/2", "1", "a/b", "1/0"])
+def test_parse_shard_invalid(value):
+    with pytest.raises(SystemExit):
+        line_checker.argument_parsing(["foo.py", "--shard", value])
+
+
+def test_main_shard_json_out_and_merge(make_temp_directory, capsys):
+    td = make_temp_directory()
+    td.add_file("foo.py", "print('ok')\n")
+    td.add_file("bar.py", "# " + "x" * 90 + "\n")
+    td.add_file("baz.py", "\n")
+    test_dir = td.get_temp_directory()
+    for i in (1, 2):
+        line_checker.main([test_dir, "--shard", f"{i}/2",
+                           "--json_out", f"shard{i}.json"])
+    with open("shard1.json") as f:
+        shard1 = json.load(f)
+    with open("shard2.json") as f:
+        shard2 = json.load(f)
+    assert len(shard1["files"]) + len(shard2["files"]) == 3
+    capsys.readouterr()
+
+    result = line_checker.main(["merge", "shard1.json", "shard2.json",
+                                "--no_color"])
+    captured_output = capsys.readouterr().out
+    assert captured_output == (
+        "Line Checker\n3 files checked: 2 Passed, 1 Failed\n"
+        f"{test_dir}/bar.py\n  line: 1  -  length: 92\n"
+    )
+    assert result == 1
+
+
+def test_merge_not_results_file(make_test_file, capsys):
+    tf = make_test_file("bad.json", "[1, 2]")
+    result = line_checker.main(["merge", tf, "--no_color"])
+    captured_output = capsys.readouterr().out
+    assert "Error merging results" in captured_output
+    assert result == line_checker.EXIT_IO_ERROR
+
+
+def test_merge_keeps_read_errors(make_temp_directory, capsys):
+    td = make_temp_directory()
+    td.add_file("foo.py", "print('ok')\n")
+    with open("bad.py", "wb") as f:
+        f.write(b"x = '\xff\xfe'\n")
+    result = line_checker.main(["bad.py", "--json_out", "shard1.json"])
+    assert result == line_checker.EXIT_IO_ERROR
+    line_checker.main(["foo.py", "--json_out", "shard2.json"])
+    with open("shard1.json") as f:
+        shard1 = json.load(f)
+    assert shard1["exit_code"] == line_checker.EXIT_IO_ERROR
+    assert shard1["errors"][0]["file"] == "bad.py"
+    capsys.readouterr()
+
+    result = line_checker.main(["merge", "shard1.json", "shard2.json",
+                                "--no_color", "--json_out", "all.json"])
+    captured_output = capsys.readouterr().out
+    assert "Error reading bad.py" in captured_output
+    assert "1 files checked: Passed" in captured_output
+    assert result == line_checker.EXIT_IO_ERROR
+    result = line_checker.main(["merge", "all.json"])
+    assert result == line_checker.EXIT_IO_ERROR
+
+
+def test_merge_worst_shard_exit_code(make_temp_directory, capsys):
+    make_temp_directory()
+    for name, code in (("a.json", 0), ("b.json", 3)):
+        with open(name, "w") as f:
+            json.dump({"files": [], "fails": [], "exit_code": code}, f)
+    assert line_checker.main(["merge", "a.json", "b.json"]) == 3
+    assert line_checker.main(["merge", "a.json"]) == 0
+
+
+@pytest.mark.parametrize("lengths, expected", [
+    (["-l88:warn", "-l120:error"], line_checker.EXIT_OK),
+    (["-l88:warn", "-l95:error"], line_checker.EXIT_VIOLATIONS),
+])
+def test_merge_keeps_severity(make_temp_directory, capsys, lengths,
+                              expected):
+    td = make_temp_directory()
+    td.add_file("foo.py", "# " + "x" * 90 + "\n" + "x" * 100 + "\n")
+    result = line_checker.main(["foo.py", "--json_out", "shard.json",
+                                "--summary_json"] + lengths)
+    assert result == expected
+    summary = json.loads(capsys.readouterr().err)
+    assert summary["files_failed"] == expected
+    result = line_checker.main(["merge", "shard.json", "--no_color"])
+    captured_output = capsys.readouterr().out
+    assert result == expected
+    assert "(warn)" in captured_output
+    state = "Failed" if expected else "Passed"
+    assert f"1 files checked: {state}" in captured_output
+
+
+def test_merge_different_thresholds(make_temp_directory, capsys):
+    td = make_temp_directory()
+    td.add_file("foo.py", "x = 1\n")
+    line_checker.main(["foo.py", "--json_out", "a.json", "-l", "80"])
+    line_checker.main(["foo.py", "--json_out", "b.json", "-l", "100"])
+    capsys.readouterr()
+    result = line_checker.main(["merge", "a.json", "b.json", "--no_color"])
+    assert "Error merging results" in capsys.readouterr().out
+    assert result == line_checker.EXIT_IO_ERROR
@@ -0,0 +1,55 @@
+from line_checker import line_checker
+
+
+def test_length_histogram():
+    histogram = line_checker.LengthHistogram()
+    for length in [0, 10, 10, 50, 90, 120]:
+        histogram.add(length)
+    assert histogram.total() == 6
+    assert histogram.max_length() == 120
+    assert histogram.lines_over(80) == 2
+    assert histogram.lines_over(120) == 0
+    assert histogram.percentile(50) == 10
+    assert histogram.percentile(99) == 120
+
+    other = line_checker.LengthHistogram()
+    other.add(200)
+    histogram.merge(other)
+    assert histogram.total() == 7
+    assert histogram.max_length() == 200
+
+
+def test_line_length_stats():
+    stats = line_checker.LineLengthStats()
+    stats.add_file("foo.py", ["x" * 90, "x" * 10])
+    stats.add_file("bar.py", ["x" * 85])
+    stats.add_file("script", ["x" * 70])
+    assert stats.histogram.lines_over(80) == 2
+    assert stats.files_over(80) == 2
+    assert stats.files_over(88) == 1
+    assert sorted(stats.file_types) == ["(none)", ".py"]
+    assert stats.file_types[".py"].total() == 3
+
+
+def test_main_stats(make_temp_directory, capsys):
+    td = make_temp_directory()
+    td.add_file("foo.py", "# " + "x" * 90 + "\n" + "x = 1\n")
+    td.add_file("bar.py", "# " + "x" * 84 + "\n")
+    test_dir = td.get_temp_directory()
+    result = line_checker.main([test_dir, "--stats", "-l", "90"])
+    captured_output = capsys.readouterr().out
+    assert captured_output == (
+        "Line Checker\n"
+        "2 files, 3 lines\n"
+        "   limit  lines over  files over\n"
+        "      72           2           2\n"
+        "      79           2           2\n"
+        "      80           2           2\n"
+        "      88           1           1\n"
+        "      90           1           1\n"
+        "     100           0           0\n"
+        "     120           0           0\n"
+        "  type           lines    p50    p90    p99    max\n"
+        "  .py                3     86     92     92     92\n"
+    )
+    assert result == line_checker.EXIT_OK